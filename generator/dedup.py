@@ -0,0 +1,155 @@
+"""
+Suppressing duplicate sentences when generating many plays.
+
+Small vocabularies and short templates often give the same sentence again,
+within a play and across plays. A DuplicateFilter remembers a fingerprint
+of each sentence generated, in Bloom filters of a fixed size rather than a
+set of every sentence, and when a sentence was seen before draws another
+one instead, up to max_resamples times before keeping the duplicate.
+
+It remembers the last capacity to 2 * capacity sentences: once a filter has
+capacity sentences, a new one is started, and the one before it is
+forgotten. Each filter mistakes a new sentence for a duplicate with about
+error_rate probability, and only costs a resample when it does.
+
+>>> dedup = DuplicateFilter(capacity=1000000)
+>>> generator = PlayGenerator(acts, vocabularies, states, dedup=dedup)
+>>> dedup.duplicate_rate, dedup.resample_cost
+"""
+
+import hashlib
+import math
+
+DEFAULT_CAPACITY = 1000000
+DEFAULT_ERROR_RATE = 0.001
+DEFAULT_MAX_RESAMPLES = 5
+
+
+class BloomFilter:
+    """
+    A set of byte strings which only answers whether it (probably) holds
+    one, in about -capacity * ln(error_rate) / ln(2)^2 bits.
+
+    :param capacity: the number of items it is sized for
+    :param error_rate: the chance of a false positive once it holds
+     capacity items
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY,
+                 error_rate=DEFAULT_ERROR_RATE):
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) /
+                                     math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def __contains__(self, item):
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(item))
+
+    def add(self, item):
+        """
+        :return: False if the item was (probably) in the filter already,
+         True if it was added
+        """
+        bits = self._bits
+        new = False
+        for position in self._positions(item):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def _positions(self, item):
+        # Double hashing: two hashes give every position
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+
+class DuplicateFilter:
+    """
+    Draws sentences until one has not been seen recently, see the module
+    docstring.
+
+    :param capacity: the number of sentences in each of the two filters
+    :param error_rate: the false positive rate of each filter when full
+    :param max_resamples: the most sentences to draw again for one sentence
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY,
+                 error_rate=DEFAULT_ERROR_RATE,
+                 max_resamples=DEFAULT_MAX_RESAMPLES):
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        if max_resamples < 0:
+            raise ValueError('max_resamples cannot be negative')
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.max_resamples = max_resamples
+        # Sentences kept, sentences drawn, draws that were seen before, and
+        # duplicates kept after max_resamples draws
+        self.sentences = 0
+        self.draws = 0
+        self.duplicates = 0
+        self.kept_duplicates = 0
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous = None
+
+    def draw_unique(self, draw):
+        """
+        :param draw: a function drawing a sentence
+        :return: the first sentence it draws that was not seen recently, or
+         the last one drawn if all max_resamples + 1 of them were
+        """
+        for attempt in range(self.max_resamples + 1):
+            sentence = draw()
+            self.draws += 1
+            if self.add(sentence):
+                break
+            self.duplicates += 1
+        else:
+            self.kept_duplicates += 1
+        self.sentences += 1
+        return sentence
+
+    def add(self, sentence):
+        """
+        Remember a sentence.
+
+        :return: False if it was (probably) seen recently, True otherwise
+        """
+        fingerprint = sentence.encode('utf-8')
+        seen = self._previous is not None and fingerprint in self._previous
+        # Added to the current filter either way, so a sentence seen again
+        # is remembered for longer
+        if not self._current.add(fingerprint):
+            seen = True
+        if self._current.count >= self.capacity:
+            self._previous = self._current
+            self._current = BloomFilter(self.capacity, self.error_rate)
+        return not seen
+
+    @property
+    def duplicate_rate(self):
+        """
+        The share of the sentences drawn that were duplicates
+        """
+        return self.duplicates / self.draws if self.draws else 0.0
+
+    @property
+    def resample_cost(self):
+        """
+        How many more sentences were drawn than kept, per sentence kept
+        """
+        if not self.sentences:
+            return 0.0
+        return (self.draws - self.sentences) / self.sentences
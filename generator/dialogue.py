@@ -2,19 +2,18 @@ from nltk.util import ngrams
 import random
 from parse_play import Play
 
-def flatten(L):
-    return [item for sublist in L for item in sublist]
-
 class PlaySkeleton:
     """
     An outline for a play.
     Lists acts, and sequences of characters within each act.
     The sequence of characters represents speakers of ongoing dialogue.
     Acts and character sequences are generated based on an input play.
+    Pass a random.Random as rng to make the generated chains reproducible.
     >>> playskeleton = PlaySkeleton(play)
     """
 
-    def __init__(self, play):
+    def __init__(self, play, rng=random):
+        self.rng = rng
         self._source_lines = play.lines
         #maps character to lines spoken by char
         self.chars = {}
@@ -28,31 +27,29 @@ class PlaySkeleton:
 
     #creates new sequence of speakers for given act
     def speaker_chain_for_act(self, act):
-        act_lines = filter(lambda line: line.act == act, self._source_lines)
-        act_speakers = list(map(lambda line: line.speaker, act_lines))
+        act_speakers = self._source_lines.speakers_in_act(act)
         return self.generate_speaker_chain(act_speakers)
 
     #gets all lines spoken by given character
     def lines_by_char(self, char):
-        char_lines = filter(lambda line: line.speaker == char, self._source_lines)
         if char:
-            return list(map(lambda line: line.line, char_lines))
+            return self._source_lines.lines_by_speaker(char)
         else:
             #stage directions
-            return flatten(map(lambda line: line.stage_direction, char_lines))
+            return self._source_lines.stage_directions_by_speaker(None)
 
 
     #predicts with bigrams sequence of speakers
     def generate_speaker_chain(self, speakers):
         bigrams = list(ngrams(speakers, 2))
-        generated_speakers = [random.choice(bigrams)[0]]
+        generated_speakers = [self.rng.choice(bigrams)[0]]
         for i in range(0, len(speakers)-1):
             last_speaker = generated_speakers[-1]
             bigrams_for_speaker = list(filter(lambda b: b[0] == last_speaker, bigrams))
             if bigrams_for_speaker:
                 #choose bigram based on previous speaker
-                generated_speakers.append(random.choice(bigrams_for_speaker)[1])
+                generated_speakers.append(self.rng.choice(bigrams_for_speaker)[1])
             else:
                 #no bigram starts with previous speaker
-                generated_speakers.append(random.choice(bigrams)[0])
+                generated_speakers.append(self.rng.choice(bigrams)[0])
         return generated_speakers
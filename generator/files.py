@@ -0,0 +1,33 @@
+"""
+Writing files that other runs (or other processes) read.
+
+>>> with replace_file('tokens.cache') as f:
+...     pickle.dump(entries, f)
+"""
+
+import os
+from contextlib import contextmanager
+
+
+@contextmanager
+def replace_file(filename):
+    """
+    Open a file to write in place of filename. It is written to a
+    temporary file next to it first, which is only renamed to filename once
+    it is complete. So a crash part way through never leaves a truncated
+    file behind, and processes that have the old file open or mapped keep
+    reading the old file.
+
+    :param filename: the file to write
+    :return: (as a context manager) the temporary file, open for writing
+     bytes
+    """
+    temp_filename = filename + '.tmp'
+    try:
+        with open(temp_filename, 'wb') as f:
+            yield f
+        os.replace(temp_filename, filename)
+    except BaseException:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        raise
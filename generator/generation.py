@@ -0,0 +1,288 @@
+"""
+Generating the speeches of a play from its skeleton (see PlaySkeleton).
+
+Each act is split into chunks of chunk_size speeches, and each chunk draws
+from its own random stream (see rng.make_rng), so chunks can be generated
+in any order, or at the same time in different processes, and still give
+exactly the same play for the same seed.
+
+>>> generator = PlayGenerator(skeleton.skeleton, vocabularies, states,
+...                           seed=1)
+>>> for text in format_text(generator.speeches(), skeleton.skeleton):
+...     print(text, end='')
+
+or with format_jsonl, as one JSON record per speech.
+
+To generate on several processes, save the vocabularies to a model file
+first (see model_file.py); each process then maps the same file:
+
+>>> save_model('play.model', vocabularies, states)
+>>> speeches = generator.speeches_parallel('play.model', processes=4)
+
+To get a play in a fixed time, generate_within stops at the first speech
+boundary after the time is up, and returns the speeches so far with how
+long each one took:
+
+>>> timed = generator.generate_within(0.5)
+>>> text = ''.join(format_text(timed.speeches, timed.acts))
+>>> timed.complete, timed.percentile(99)
+"""
+
+import json
+import math
+import os
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from grammar import Grammar
+from model_file import MappedModel
+from rng import make_rng
+
+DEFAULT_CHUNK_SIZE = 50
+
+
+class Speech(namedtuple('Speech', ['act', 'speaker', 'sentences'])):
+    """
+    One generated speech: the index of its act, its speaker (None for a
+    stage direction) and its list of sentences
+    """
+    __slots__ = ()
+
+
+class TimedPlay(namedtuple('TimedPlay', ['speeches', 'acts', 'complete',
+                                         'elapsed', 'latencies'])):
+    """
+    A play generated within a time budget, see PlayGenerator.generate_within:
+    its list of Speeches, the acts they belong to (up to the last one
+    reached), whether it is the whole play, the seconds it took and the
+    seconds each speech took.
+    """
+    __slots__ = ()
+
+    def percentile(self, percent):
+        """
+        :param percent: e.g. 50 for the median
+        :return: the seconds within which that percentage of the speeches
+         were generated, or None if there were none
+        """
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        rank = max(1, math.ceil(percent / 100 * len(latencies)))
+        return latencies[rank - 1]
+
+
+class PlayGenerator:
+    """
+    Fills the speakers of each act of a play skeleton with sentences.
+
+    :param acts: a list of (act name, list of speakers), as in
+     PlaySkeleton.skeleton
+    :param vocabularies: maps each speaker (and None, for stage directions)
+     to a trained Vocabulary
+    :param states: the grammar states, as returned by Grammar.load_machine
+    :param template_pool: a TemplatePool to draw templates from instead of
+     walking the grammar for each sentence
+    :param seed: the seed of every chunk's random stream, or None for
+     different output every time
+    :param chunk_size: the number of speeches in each chunk
+    :param dedup: a DuplicateFilter to draw sentences again when they were
+     generated before (see dedup.py), which can be shared by the
+     generators of many plays
+    """
+
+    def __init__(self, acts, vocabularies, states, template_pool=None,
+                 seed=None, chunk_size=DEFAULT_CHUNK_SIZE, dedup=None):
+        self.acts = acts
+        self.vocabularies = vocabularies
+        self.states = states
+        self.template_pool = template_pool
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.dedup = dedup
+        self.grammar = Grammar()
+
+    def chunks(self):
+        """
+        :return: (act index, chunk index) of every chunk, in order
+        """
+        for act_index, (act_name, speakers) in enumerate(self.acts):
+            for chunk_index in range(
+                    -(-len(speakers) // self.chunk_size)):
+                yield act_index, chunk_index
+
+    def generate_chunk(self, act_index, chunk_index):
+        """
+        :return: the list of Speeches of one chunk of an act
+        """
+        return list(self._chunk_speeches(act_index, chunk_index))
+
+    def _chunk_speeches(self, act_index, chunk_index):
+        # Generated one at a time, so the caller can stop part way through
+        rng = make_rng(self.seed, "act", act_index, "chunk", chunk_index)
+        start = chunk_index * self.chunk_size
+        speakers = self.acts[act_index][1][start:start + self.chunk_size]
+        for speaker in speakers:
+            yield self.generate_speech(act_index, speaker, rng)
+
+    def generate_speech(self, act_index, speaker, rng):
+        vocab = self.vocabularies[speaker]
+        if speaker:
+            # A character-dependent number of sentences
+            num_sentences = vocab.random_sentence_count(rng)
+        else:
+            num_sentences = 1
+        return Speech(act_index, speaker,
+                      [self.generate_sentence(vocab, rng)
+                       for i in range(num_sentences)])
+
+    def generate_sentence(self, vocab, rng):
+        if self.dedup is not None:
+            return self.dedup.draw_unique(
+                lambda: self._draw_sentence(vocab, rng))
+        return self._draw_sentence(vocab, rng)
+
+    def _draw_sentence(self, vocab, rng):
+        if self.template_pool:
+            template = self.template_pool.draw(rng)
+        else:
+            template = self.grammar.make_template_simple(self.states, rng)
+        return vocab.build_sentence(template, rng)
+
+    def speeches(self):
+        """
+        Generate the whole play in this process.
+
+        :return: an iterator of the Speeches of the play, in order
+        """
+        for act_index, chunk_index in self.chunks():
+            yield from self._chunk_speeches(act_index, chunk_index)
+
+    def generate_within(self, budget, clock=time.perf_counter):
+        """
+        Generate the play in this process until it is done or budget seconds
+        have passed, whichever is first. The speeches generated are the
+        same as the first ones of speeches(). A speech that has started is
+        always finished, so the play can run over budget by as much as one
+        speech takes.
+
+        :param budget: the seconds to generate for
+        :param clock: the function giving the time in seconds
+        :return: a TimedPlay
+        """
+        total = sum(len(speakers) for act_name, speakers in self.acts)
+        speeches = []
+        latencies = []
+        start = now = clock()
+        deadline = start + budget
+        generated = self.speeches()
+        while len(speeches) < total and now < deadline:
+            speeches.append(next(generated))
+            before, now = now, clock()
+            latencies.append(now - before)
+        generated.close()
+        # Only the acts that were reached, so the script ends after the
+        # last speech
+        acts_reached = speeches[-1].act + 1 if speeches else 0
+        if len(speeches) == total:
+            acts_reached = len(self.acts)
+        return TimedPlay(speeches, self.acts[:acts_reached],
+                         len(speeches) == total, now - start, latencies)
+
+    def speeches_parallel(self, model_filename, processes=None,
+                          max_pending=None):
+        """
+        Generate the play on a pool of processes, each of which generates
+        whole chunks with the vocabularies in model_filename. The result is
+        exactly the same as speeches() with the vocabularies that were saved
+        there.
+
+        :param model_filename: a model file with a vocabulary for every
+         speaker, see model_file.save_model
+        :param processes: the number of processes, by default one per CPU
+        :param max_pending: the most chunks generated ahead of the one
+         being yielded, by default four per process
+        :return: an iterator of the Speeches of the play, in order
+        """
+        if self.dedup is not None:
+            # Which sentences are duplicates depends on every sentence
+            # before them, so they cannot be generated out of order
+            raise ValueError('Duplicate suppression needs the speeches to '
+                             'be generated in order, in one process')
+        processes = processes or os.cpu_count() or 1
+        max_pending = max_pending or 4 * processes
+        with ProcessPoolExecutor(processes, initializer=_start_worker,
+                                 initargs=(model_filename, self.acts,
+                                           self.states, self.template_pool,
+                                           self.seed, self.chunk_size)) \
+                as executor:
+            # Chunks are submitted in order and yielded from the front, so
+            # the output is in order however the chunks finish
+            pending = deque()
+            for act_index, chunk_index in self.chunks():
+                pending.append(executor.submit(_generate_chunk, act_index,
+                                               chunk_index))
+                if len(pending) >= max_pending:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+
+_worker_generator = None
+
+
+def _start_worker(model_filename, acts, states, template_pool, seed,
+                  chunk_size):
+    global _worker_generator
+    model = MappedModel(model_filename)
+    vocabularies = {name: model.vocabulary(name) for name in model.names()}
+    _worker_generator = PlayGenerator(acts, vocabularies, states,
+                                      template_pool, seed, chunk_size)
+
+
+def _generate_chunk(act_index, chunk_index):
+    return _worker_generator.generate_chunk(act_index, chunk_index)
+
+
+def format_text(speeches, acts):
+    """
+    :param speeches: Speeches in order, e.g. from PlayGenerator.speeches
+    :param acts: the acts they belong to, as in PlaySkeleton.skeleton
+    :return: an iterator of the text of the play, with a heading for each
+     act, each speech under its speaker's name and stage directions in
+     brackets
+    """
+    next_act = 0
+    for speech in speeches:
+        while next_act <= speech.act:
+            yield acts[next_act][0] + "\n\n"
+            next_act += 1
+        if speech.speaker:
+            yield speech.speaker.upper() + ":\n" + \
+                " ".join(speech.sentences) + "\n\n"
+        else:
+            yield "[" + " ".join(speech.sentences) + "]\n\n"
+    for act_name, speakers in acts[next_act:]:
+        yield act_name + "\n\n"
+
+
+def format_jsonl(speeches, acts, seed=None, play=0):
+    """
+    :param speeches: Speeches in order, e.g. from PlayGenerator.speeches
+    :param acts: the acts they belong to, as in PlaySkeleton.skeleton
+    :param seed: the seed the play was generated with
+    :param play: the number of the play, e.g. when generating many
+    :return: an iterator of a line of JSON for each speech, with the play,
+     seed, act (and its name), speaker (null for a stage direction),
+     whether it is a stage direction, and its sentences
+    """
+    for speech in speeches:
+        yield json.dumps({'play': play,
+                          'seed': seed,
+                          'act': speech.act,
+                          'act_name': acts[speech.act][0],
+                          'speaker': speech.speaker,
+                          'stage_direction': not speech.speaker,
+                          'sentences': speech.sentences},
+                         ensure_ascii=False) + '\n'
@@ -1,9 +1,19 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import nltk, random, os
+import nltk, random, os, struct, sys, hashlib
+from array import array
+from files import replace_file
+from rng import make_rng
 
 NUM_RULE = 50
+DEFAULT_POOL_SIZE = 20000
+
+# magic, byte order mark, key, number of tags, bytes of tags, number of
+# templates, number of tag ids
+POOL_MAGIC = b'PLAYTPL2'
+POOL_BYTE_ORDER_MARK = 0x01020304
+POOL_HEADER = struct.Struct('=8sI16s4I')
 
 class State:
 
@@ -16,18 +26,112 @@ class State:
         rhs = [transition.__str__() for transition in self.transitions]
         return self.pos.__str__() + "," + str(rhs)
 
-    def pick_transition(self):
+    def pick_transition(self, rng=random):
         trans = [transition for transition, freq in self.transitions]
-        return random.choice(trans)
+        return rng.choice(trans)
 
-    def pick_transition_simple(self):
-        picked_state = random.choice(self.transitions)
+    def pick_transition_simple(self, rng=random):
+        picked_state = rng.choice(self.transitions)
         return picked_state
 
 
+class TemplatePool:
+    """
+    Sentence templates generated ahead of time, so that drawing a template is
+    a single random index rather than a walk through the state machine.
+    Templates are stored as one array of tag ids into a table of interned
+    tags, so a pool of many thousands of templates is small, and every
+    template drawn is made of the same few tag strings, whose hashes are
+    computed once for all of the vocabulary's lookups.
+    >>> pool = grammar.make_template_pool(states, 10000)
+    >>> pool.draw(rng)
+    ['DT', 'JJ', 'NN', 'VBD', 'RB']
+    """
+
+    def __init__(self, templates=(), key=b''):
+        #what the pool was generated from, see Grammar.load_template_pool
+        self.key = key
+        self.tags = []
+        self._tag_ids = {}
+        #template i is self._ids[offsets[i]:offsets[i + 1]]
+        self._offsets = array('I', [0])
+        self._ids = array('H')
+        for template in templates:
+            self.append(template)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        tags = self.tags
+        return [tags[tag_id] for tag_id in
+                self._ids[self._offsets[index]:self._offsets[index + 1]]]
+
+    def append(self, template):
+        for tag in template:
+            if tag not in self._tag_ids:
+                self._tag_ids[tag] = len(self.tags)
+                self.tags.append(sys.intern(tag))
+            self._ids.append(self._tag_ids[tag])
+        self._offsets.append(len(self._ids))
+
+    def draw(self, rng=random):
+        """
+        :return: a template from the pool, each equally likely
+        """
+        return self[rng.randrange(len(self))]
+
+    def save(self, filename):
+        tag_bytes = '\n'.join(self.tags).encode('utf-8')
+        with replace_file(filename) as f:
+            f.write(POOL_HEADER.pack(POOL_MAGIC, POOL_BYTE_ORDER_MARK,
+                                     self.key, len(self.tags),
+                                     len(tag_bytes), len(self),
+                                     len(self._ids)))
+            f.write(tag_bytes)
+            f.write(self._offsets.tobytes())
+            f.write(self._ids.tobytes())
+
+    @classmethod
+    def load(cls, filename):
+        """
+        :return: the pool saved in filename, or None if it is not a pool
+         file written on this kind of machine
+        """
+        with open(filename, 'rb') as f:
+            header = f.read(POOL_HEADER.size)
+            if len(header) < POOL_HEADER.size:
+                return None
+            (magic, byte_order_mark, key, num_tags, num_tag_bytes,
+             num_templates, num_ids) = POOL_HEADER.unpack(header)
+            if magic != POOL_MAGIC or byte_order_mark != POOL_BYTE_ORDER_MARK:
+                return None
+            pool = cls(key=key)
+            if num_tags:
+                pool.tags = [sys.intern(tag) for tag in
+                             f.read(num_tag_bytes).decode('utf-8').split('\n')]
+            pool._tag_ids = {tag: i for i, tag in enumerate(pool.tags)}
+            pool._offsets = array('I')
+            pool._ids = array('H')
+            try:
+                pool._offsets.fromfile(f, num_templates + 1)
+                pool._ids.fromfile(f, num_ids)
+            except EOFError:
+                return None
+        return pool
+
+
+def _pool_key(states, size, seed):
+    #identifies the pool generated from these states with this size and seed
+    description = repr([(state.pos, state.output, state.transitions)
+                        for state in states.values()]) + repr((size, seed))
+    return hashlib.blake2b(description.encode('utf-8'), digest_size=16).digest()
+
+
 class Grammar:
 
-    def __init__(self):
+    def __init__(self, rng=random):
+        self.rng = rng
         self.ruleset = None
         self.terminal_nodes = []
         self.template = []
@@ -36,31 +140,61 @@ class Grammar:
         self.common_rules = []
 
 
-    def make_template_simple(self, states):
+    def make_template_simple(self, states, rng=None):
         """
         generate sentence templates (PSRs) from simple rules storing in states.txt file
         all the tags in states.txt file match the tags in the Penn Treebank
-        rules are randomly chosen using random.choice()
+        rules are randomly chosen using rng.choice()
+
+        rng: random.Random to draw from, defaults to the grammar's own rng
         """
+        rng = rng or self.rng
         current_state = states['<START>']
         template = []
         rep_state = {'P3':0, 'CC':0}
         while current_state.pos != '<END>':
             template.append(current_state.output)
-            picked_state = current_state.pick_transition_simple()
+            picked_state = current_state.pick_transition_simple(rng)
             current_state = states[picked_state]
             # control the depth of PP and CC
             if picked_state in ('P3', 'CC'):
                 rep_state[picked_state] += 1
             if rep_state['P3'] >= 2:
                 while(picked_state == 'P3'):
-                    picked_state = current_state.pick_transition_simple()
+                    picked_state = current_state.pick_transition_simple(rng)
             if rep_state['CC'] >= 2:
                 while(picked_state in ('P3', 'CC')):
-                    picked_state = current_state.pick_transition_simple()
+                    picked_state = current_state.pick_transition_simple(rng)
 
         return [t for t in template if t != '<NULL>']
 
+    def make_template_pool(self, states, size=DEFAULT_POOL_SIZE, rng=None):
+        """
+        generate a TemplatePool of size templates with make_template_simple
+
+        rng: random.Random to draw from, defaults to the grammar's own rng
+        """
+        rng = rng or self.rng
+        return TemplatePool(self.make_template_simple(states, rng)
+                            for i in range(size))
+
+    def load_template_pool(self, states, filename, size=DEFAULT_POOL_SIZE, seed=None):
+        """
+        like make_template_pool, but cached in filename: the pool saved there is
+        loaded if it was generated from the same states, size and seed, otherwise
+        a new pool is generated (drawing from make_rng(seed, "templates")) and saved
+
+        """
+        key = _pool_key(states, size, seed)
+        if os.path.exists(filename):
+            pool = TemplatePool.load(filename)
+            if pool is not None and pool.key == key:
+                return pool
+        pool = self.make_template_pool(states, size, make_rng(seed, "templates"))
+        pool.key = key
+        pool.save(filename)
+        return pool
+
         # make template from simple rules
     def load_machine(self, filename):
         """
@@ -94,7 +228,7 @@ class Grammar:
         """
 
         current_state = self.states[root_symbol]
-        rhs = current_state.pick_transition()
+        rhs = current_state.pick_transition(self.rng)
         for part in rhs:
             if part in self.terminal_nodes:
                 self.template.append(part.__str__())
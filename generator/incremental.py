@@ -0,0 +1,195 @@
+"""
+Keeping a play's trained vocabularies between runs, and updating them when
+the play is edited instead of training them all again.
+
+A TrainingState keeps the last parse of the play (its PlayData) and every
+speaker's vocabulary in a file. Given the lines of the play as parsed now,
+it compares each speaker's utterances with the ones it has, and only
+touches the vocabularies of speakers whose utterances changed: the
+utterances that are gone are taken out of the counts and the new ones
+counted (see Vocabulary.update), so editing one speech costs about as much
+as tagging that speech. The shared base vocabulary, if there is one, is
+updated the same way for every change.
+
+Pruned vocabularies cannot be updated, so with min_counts or top_k those
+of the speakers whose utterances changed are trained again from scratch.
+
+>>> state = TrainingState('hamlet.state', token_cache=cache)
+>>> play = Play('hamlet.htm', 'charname', 'scenedesc')
+>>> vocabs = state.train(play.lines, play.chars)
+>>> state.save()
+>>> state.updated
+['Hamlet']
+"""
+
+import os
+import pickle
+from collections import Counter
+
+from files import replace_file
+from parse_play import PlayData
+from vocabulary import Vocabulary
+
+STATE_VERSION = 1
+
+
+class TrainingState:
+
+    def __init__(self, filename=None, base=None, **vocab_options):
+        """
+        :param filename: file to load the state from (if it exists) and to
+         save it to, or None to only keep it in memory
+        :param base: a base vocabulary shared by every speaker, which is
+         trained on all of their utterances
+        :param vocab_options: keyword arguments for each Vocabulary; a state
+         saved with different ones is ignored
+        """
+        self.filename = filename
+        self.base = base
+        self.vocab_options = vocab_options
+        self.vocabularies = {}
+        # The names of the speakers updated or trained again by the last
+        # call to train
+        self.updated = []
+        self.retrained = []
+        self._lines = PlayData()
+        self._base_trained = False
+        if filename and os.path.exists(filename):
+            with open(filename, 'rb') as f:
+                saved = pickle.load(f)
+            if saved['key'] == self._key():
+                self._restore(saved)
+
+    def train(self, lines, names):
+        """
+        Bring the vocabularies up to date with the lines of the play.
+
+        :param lines: the PlayData of the play, as parsed now
+        :param names: the names to keep a vocabulary for, e.g. Play.chars
+         (with None for the stage directions)
+        :return: dict mapping each name to its trained Vocabulary
+        """
+        old_utterances = _utterances_by_speaker(self._lines)
+        new_utterances = _utterances_by_speaker(lines)
+        self.updated = []
+        self.retrained = []
+
+        if self.base is not None:
+            vocab_options = dict(self.vocab_options, base=self.base)
+            self._train_base(lines, old_utterances, new_utterances)
+        else:
+            vocab_options = self.vocab_options
+
+        vocabularies = {}
+        for name in names:
+            old = old_utterances.get(name, [])
+            new = new_utterances.get(name, [])
+            vocab = self.vocabularies.get(name)
+            if vocab is not None and old == new:
+                vocabularies[name] = vocab
+                continue
+            if vocab is None or self._pruning():
+                vocab = Vocabulary(**vocab_options)
+                vocab.train(new)
+                self.retrained.append(name)
+            else:
+                vocab.update(*_difference(old, new))
+                self.updated.append(name)
+            vocabularies[name] = vocab
+        self.vocabularies = vocabularies
+        self._lines = lines
+        return vocabularies
+
+    def save(self, filename=None):
+        """
+        Write the state to filename, or to the file it was loaded from.
+        """
+        filename = filename or self.filename
+        saved = {
+            'key': self._key(),
+            'lines': self._lines,
+            'vocabularies': {name: _vocabulary_state(vocab)
+                             for name, vocab in self.vocabularies.items()},
+            'base': _vocabulary_state(self.base)
+            if self.base is not None and self._base_trained else None,
+        }
+        with replace_file(filename) as f:
+            pickle.dump(saved, f, pickle.HIGHEST_PROTOCOL)
+
+    def _train_base(self, lines, old_utterances, new_utterances):
+        added = []
+        removed = []
+        for name in set(old_utterances) | set(new_utterances):
+            old = old_utterances.get(name, [])
+            new = new_utterances.get(name, [])
+            if old != new:
+                name_added, name_removed = _difference(old, new)
+                added += name_added
+                removed += name_removed
+        if not self._base_trained or (
+                (added or removed) and self._pruning()):
+            # In the order of the play, the same as main.py
+            self.base.train([text for speaker, text in lines.utterances()])
+            self._base_trained = True
+        elif added or removed:
+            self.base.update(added, removed)
+
+    def _restore(self, saved):
+        vocab_options = dict(self.vocab_options, base=self.base) \
+            if self.base is not None else self.vocab_options
+        for name, vocab_state in saved['vocabularies'].items():
+            vocab = Vocabulary(**vocab_options)
+            _set_vocabulary_state(vocab, vocab_state)
+            self.vocabularies[name] = vocab
+        if self.base is not None and saved['base'] is not None:
+            _set_vocabulary_state(self.base, saved['base'])
+            self._base_trained = True
+        self._lines = saved['lines']
+
+    def _pruning(self):
+        return bool(self.vocab_options.get('min_counts') or
+                    self.vocab_options.get('top_k'))
+
+    def _key(self):
+        # Everything that changes what a vocabulary counts
+        options = self.vocab_options
+        vocab = Vocabulary(**options)
+        return (STATE_VERSION, vocab.word_order, vocab.use_next_tag,
+                vocab.tagger.name, vocab.tokenizer.name,
+                tuple(options.get('min_counts') or ()), options.get('top_k'),
+                None if self.base is None else self.base.word_order)
+
+
+def _utterances_by_speaker(lines):
+    # What each speaker's vocabulary is trained on, in order
+    utterances = {}
+    for speaker, text in lines.utterances():
+        utterances.setdefault(speaker, []).append(text)
+    return utterances
+
+
+def _difference(old, new):
+    # (added, removed) to turn the utterances old into new, in order
+    old_counts = Counter(old)
+    new_counts = Counter(new)
+    added = []
+    for utterance in new:
+        if old_counts[utterance]:
+            old_counts[utterance] -= 1
+        else:
+            added.append(utterance)
+    removed = []
+    for utterance in old:
+        if new_counts[utterance]:
+            new_counts[utterance] -= 1
+        else:
+            removed.append(utterance)
+    return added, removed
+
+
+def _vocabulary_state(vocab):
+    return vocab.root, vocab.sentence_counts, vocab.prune_stats
+
+
+def _set_vocabulary_state(vocab, vocab_state):
+    vocab.root, vocab.sentence_counts, vocab.prune_stats = vocab_state
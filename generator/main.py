@@ -1,10 +1,21 @@
 import argparse
 import os
-import random
+import sys
+import tempfile
+from dedup import DEFAULT_CAPACITY, DEFAULT_MAX_RESAMPLES, DuplicateFilter
 from dialogue import PlaySkeleton
-from grammar import Grammar
+from generation import PlayGenerator, format_jsonl, format_text
+from grammar import DEFAULT_POOL_SIZE, Grammar
+from incremental import TrainingState
+from model_file import MappedModel, save_model
+from output import DEFAULT_SHARD_SIZE, ShardedWriter, check_pattern
 from parse_play import Play
-from vocabulary import Vocabulary
+from pipeline import train_play
+from rng import make_rng
+from tagging import BACKENDS, DEFAULT_TAGGER, get_tagger
+from token_cache import TokenCache
+from tokenizing import DEFAULT_TOKENIZER, TOKENIZERS, get_tokenizer
+from vocabulary import Vocabulary, VocabularyRegistry
 
 """
 Running python3 generator/main.py [SOURCE PLAY]
@@ -12,6 +23,53 @@ prints a generated play to standard output.
 The optional flag --chartag specifies which tag is used in the source html
 to specify a character, and --stagetag specifies the tag used
 for stage directions.
+The optional flag --seed makes the output reproducible: the same seed and
+source play always give the same generated play.
+--save-model writes the trained vocabularies and grammar to a model file,
+and --model loads them from one instead of training, e.g. for running many
+generators at once which then share one copy of the model in memory.
+--tagger picks the part of speech tagger: "perceptron" (the default) or the
+faster but less accurate "lookup".
+--tokenizer picks how lines are split into sentences and words: "punkt" (the
+default, nltk's tokenizers) or the several times faster "regex".
+--word-order sets how many previous words each generated word depends on.
+--shared-base trains one vocabulary on the whole play, which characters fall
+back to instead of keeping their own copies of the tag-only contexts.
+--token-cache keeps the tokenized and tagged lines in a file, so that
+training on the same text again does not need to tag it again.
+--template-pool draws sentence templates from a pool of that many templates
+generated ahead of time (and --template-cache keeps the pool in a file)
+instead of walking the grammar for every sentence.
+--jobs generates the play on that many processes at once; the output is the
+same as generating them one after another.
+--workers trains every vocabulary up front while the play is still being
+parsed, tagging on that many processes at once.
+--train-state keeps the parsed play and every trained vocabulary in a file,
+and when the play has been edited since, only updates the vocabularies of
+the speakers whose lines changed.
+--format jsonl prints one JSON record per speech instead of the text of the
+play: its play, seed, act, speaker, whether it is a stage direction and its
+sentences.
+--plays generates that many plays from the same trained vocabularies, each
+with its own seed derived from --seed.
+--output writes to files of --shard-size records each instead of standard
+output, named by formatting the given name with the index of each file,
+and compressed if the name ends in .gz (or .zst, with zstandard installed),
+e.g. --output=plays-{:04d}.jsonl.gz. With the text format each play is one
+record.
+--time-budget stops generating each play after that many seconds (at the end
+of a speech), printing the play so far, and prints how many speeches were
+generated and how long they took to standard error. It generates in this
+process, so --jobs is ignored.
+--dedup draws a sentence again (up to --max-resamples times) when the same
+sentence was generated before, in this play or an earlier one of --plays,
+remembering the last 1000000 (or the given number of) sentences in a fixed
+amount of memory, and prints how many were duplicates to standard error.
+It needs the sentences to be generated in order, so it cannot be used with
+--jobs.
+--min-counts and --top-k prune rare words from the trained vocabularies to
+keep them (and saved models) small, and --prune-report prints how much of
+each level of contexts was kept to standard error.
 
 To save a generated play based on "A Doll's House" as "doll_play.txt", run
 >>>python3 generator/main.py source_plays/a_dolls_house.htm > doll_play.txt
@@ -20,47 +78,215 @@ To save a generated play based on "Hamlet" as "hamlet_play.txt", run:
 >>>python3 generator/main.py source_plays/hamlet.htm --chartag=charname --stagetag=scenedesc > hamlet_play.txt
 """
 
+def count_list(text):
+    #a comma separated list of counts, e.g. --min-counts 1,1,2
+    try:
+        counts = [int(count) for count in text.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError("%r is not a comma separated list of counts" % text)
+    if any(count < 0 for count in counts):
+        raise argparse.ArgumentTypeError("counts cannot be negative, got %r" % text)
+    return counts
+
 parser = argparse.ArgumentParser()
 parser.add_argument("filename", help="filename of play to parse")
 parser.add_argument("--chartag", default="character", required=False,
                     help="tag in the html used to denote a character of the play")
 parser.add_argument("--stagetag", default="stage-direction", required=False,
                     help="tag in the html used to denote stage directions")
+parser.add_argument("--seed", default=None, required=False,
+                    help="seed for the random choices, for reproducible output")
+parser.add_argument("--model", default=None, required=False,
+                    help="model file to load instead of training on the play")
+parser.add_argument("--save-model", default=None, required=False,
+                    help="file to save the trained model to")
+parser.add_argument("--token-cache", default=None, required=False,
+                    help="file to cache tokenized and tagged lines in")
+parser.add_argument("--tagger", default=DEFAULT_TAGGER, choices=sorted(BACKENDS),
+                    required=False, help="part of speech tagger to train with")
+parser.add_argument("--tokenizer", default=DEFAULT_TOKENIZER, choices=sorted(TOKENIZERS),
+                    required=False, help="tokenizer to split lines into sentences and words with")
+parser.add_argument("--shared-base", action="store_true",
+                    help="share one play-wide vocabulary between characters to save memory")
+parser.add_argument("--word-order", default=1, type=int, required=False,
+                    help="number of previous words each word depends on")
+parser.add_argument("--min-counts", default=None, type=count_list, required=False,
+                    help="comma separated least count of a kept word for each context level, starting with the tag")
+parser.add_argument("--top-k", default=None, type=int, required=False,
+                    help="most words to keep for each context")
+parser.add_argument("--template-pool", default=None, type=int, required=False,
+                    help="number of sentence templates to generate ahead of time and draw from")
+parser.add_argument("--template-cache", default=None, required=False,
+                    help="file to keep the template pool in")
+parser.add_argument("--jobs", default=None, type=int, required=False,
+                    help="number of processes to generate the play on")
+parser.add_argument("--workers", default=None, type=int, required=False,
+                    help="train all vocabularies up front, tagging on this many processes")
+parser.add_argument("--train-state", default=None, required=False,
+                    help="file to keep the trained vocabularies in, to only retrain what changed in the play")
+parser.add_argument("--format", default="text", choices=["text", "jsonl"], required=False,
+                    help="write the play as text or as one JSON record per speech")
+parser.add_argument("--plays", default=1, type=int, required=False,
+                    help="number of plays to generate")
+parser.add_argument("--output", default=None, required=False,
+                    help="filename pattern of the files to write to, e.g. plays-{:04d}.jsonl.gz")
+parser.add_argument("--shard-size", default=DEFAULT_SHARD_SIZE, type=int, required=False,
+                    help="number of records in each output file")
+parser.add_argument("--time-budget", default=None, type=float, required=False,
+                    help="seconds to generate each play for, printing as much of it as is done by then")
+parser.add_argument("--dedup", default=None, type=int, nargs="?", const=DEFAULT_CAPACITY,
+                    help="draw sentences generated before again, remembering this many sentences")
+parser.add_argument("--max-resamples", default=DEFAULT_MAX_RESAMPLES, type=int, required=False,
+                    help="most times to draw a duplicate sentence again")
+parser.add_argument("--prune-report", action="store_true",
+                    help="print the size and retained counts of each context level after pruning")
 args = parser.parse_args()
-play = Play(args.filename, args.chartag, args.stagetag)
-playskeleton = PlaySkeleton(play)
+if args.word_order < 0:
+    parser.error("--word-order cannot be negative")
+if args.shard_size < 1:
+    parser.error("--shard-size must be at least 1")
+if args.output:
+    try:
+        check_pattern(args.output)
+    except ValueError as error:
+        parser.error("--output: " + str(error))
+if args.model and args.save_model:
+    parser.error("--save-model cannot be used with --model, which is already a model file")
+if args.dedup is not None and args.dedup < 1:
+    parser.error("--dedup must remember at least 1 sentence")
+if args.max_resamples < 0:
+    parser.error("--max-resamples cannot be negative")
+if args.dedup and args.jobs and not args.time_budget:
+    parser.error("--dedup cannot be used with --jobs")
 
-def num_sentences(line):
-    return len(line.split("."))
+model = MappedModel(args.model) if args.model else None
+token_cache = TokenCache(args.token_cache) if args.token_cache else None
+vocab_options = {"token_cache": token_cache,
+                 "word_order": args.word_order,
+                 "tagger": get_tagger(args.tagger),
+                 "tokenizer": get_tokenizer(args.tokenizer),
+                 "top_k": args.top_k}
+if args.min_counts:
+    vocab_options["min_counts"] = args.min_counts
+#the characters only look up contexts of just tags in the base
+base = Vocabulary(**dict(vocab_options, word_order=0)) if args.shared_base else None
 
-speaker_vocab = {}
-speaker_line_length = {}
-for char in playskeleton.chars:
-    #character-dependent vocabulary
-    speaker_vocab[char] = Vocabulary()
-    speaker_vocab[char].train(playskeleton.chars[char])
+if args.workers and not model and not args.train_state:
+    #tag and count lines while the rest of the play is still being parsed
+    play, speaker_vocab = train_play(args.filename, args.chartag, args.stagetag,
+                                     workers=args.workers, base=base, **vocab_options)
+else:
+    play = Play(args.filename, args.chartag, args.stagetag)
+playskeleton = PlaySkeleton(play, make_rng(args.seed, "skeleton"))
 
-    #character-dependent line length
-    speaker_line_length[char] = list(map(num_sentences, playskeleton.chars[char]))
+#character-dependent vocabulary
+if model:
+    speaker_vocab = {char: model.vocabulary(char) for char in playskeleton.chars}
+elif args.train_state:
+    #only the speakers whose lines changed since the last run are trained
+    training_state = TrainingState(args.train_state, base=base, **vocab_options)
+    speaker_vocab = training_state.train(play.lines, playskeleton.chars)
+    training_state.save()
+elif not args.workers:
+    if base:
+        #in the order of the play, the same as when pipelined
+        base.train([text for speaker, text in play.lines.utterances()])
+        vocab_options["base"] = base
+    #each character is only trained when they first speak
+    speaker_vocab = VocabularyRegistry(playskeleton.chars, **vocab_options)
 
 cfg = Grammar()
-states = cfg.load_machine(os.path.dirname(os.path.abspath(__file__)) + '/states.txt')
+if model:
+    states = model.states()
+else:
+    states = cfg.load_machine(os.path.dirname(os.path.abspath(__file__)) + '/states.txt')
+if args.save_model:
+    save_model(args.save_model,
+               {char: speaker_vocab[char] for char in playskeleton.chars},
+               states)
 
-#generate random sentence based on vocabulary
-def generate_sentence(vocab):
-    template = cfg.make_template_simple(states)
-    return vocab.build_sentence(template)
+template_pool = None
+if args.template_cache:
+    template_pool = cfg.load_template_pool(states, args.template_cache,
+                                           args.template_pool or DEFAULT_POOL_SIZE, args.seed)
+elif args.template_pool:
+    template_pool = cfg.make_template_pool(states, args.template_pool, make_rng(args.seed, "templates"))
 
-for act in playskeleton.skeleton:
-    print(act[0] + "\n")
-    speakers = act[1]
-    for speaker in speakers:
-        if speaker:
-            #generate sentences based on speaker
-            num_sentences = random.choice(speaker_line_length[speaker])
-            print(speaker.upper() + ":")
-            sentences = map(lambda i: generate_sentence(speaker_vocab[speaker]), range(num_sentences))
-            print(" ".join(sentences) + "\n")
+if args.jobs and not args.time_budget:
+    #each process maps the vocabularies from a model file
+    model_filename = args.model or args.save_model
+    if not model_filename:
+        handle, model_filename = tempfile.mkstemp(suffix=".model")
+        os.close(handle)
+        save_model(model_filename, {char: speaker_vocab[char] for char in playskeleton.chars}, states)
+#one filter for every play, so sentences are not repeated between plays either
+dedup = DuplicateFilter(args.dedup, max_resamples=args.max_resamples) if args.dedup else None
+#with --output, plays are compressed and written on a background thread
+out = ShardedWriter(args.output, args.shard_size) if args.output else sys.stdout
+try:
+    for play_index in range(args.plays):
+        #the first play is the same as when only generating one
+        if play_index == 0:
+            seed = args.seed
+        else:
+            #the streams of (seed, "play", play_index), see rng.py
+            seed = None if args.seed is None else (args.seed, "play", play_index)
+            playskeleton = PlaySkeleton(play, make_rng(seed, "skeleton"))
+        generator = PlayGenerator(playskeleton.skeleton, speaker_vocab, states, template_pool, seed,
+                                  dedup=dedup)
+        acts = playskeleton.skeleton
+        if args.time_budget:
+            #as much of the play as can be generated in time
+            timed = generator.generate_within(args.time_budget)
+            speeches, acts = timed.speeches, timed.acts
+            print("generated %d of %d speeches in %.3fs%s, per speech p50 %.2fms p99 %.2fms"
+                  % (len(timed.speeches), sum(len(speakers) for name, speakers in playskeleton.skeleton),
+                     timed.elapsed, "" if timed.complete else " (out of time)",
+                     1000 * (timed.percentile(50) or 0), 1000 * (timed.percentile(99) or 0)),
+                  file=sys.stderr)
+        elif args.jobs:
+            speeches = generator.speeches_parallel(model_filename, args.jobs)
+        else:
+            speeches = generator.speeches()
+        if args.format == "jsonl":
+            #--seed and the play number are what reproduce each play
+            for record in format_jsonl(speeches, acts, args.seed, play_index):
+                out.write(record)
+        elif args.output:
+            #a whole play is one record, so plays are never split between shards
+            out.write("".join(format_text(speeches, acts)))
         else:
-            #generate stage direction
-            print("[" + generate_sentence(speaker_vocab[None]) + "]\n")
+            for text in format_text(speeches, acts):
+                out.write(text)
+finally:
+    if args.output:
+        out.close()
+    if args.jobs and not args.time_budget and model_filename not in (args.model, args.save_model):
+        os.remove(model_filename)
+
+if dedup:
+    print("%d sentences, %.1f%% of %d drawn were duplicates, %.3f resamples per sentence, %d duplicates kept"
+          % (dedup.sentences, 100 * dedup.duplicate_rate, dedup.draws, dedup.resample_cost,
+             dedup.kept_duplicates), file=sys.stderr)
+
+if token_cache:
+    token_cache.save()
+
+if args.prune_report and not model:
+    #totals over every vocabulary that was trained (and so pruned)
+    if args.workers or args.train_state:
+        vocabs = list(speaker_vocab.values())
+    else:
+        vocabs = [speaker_vocab[char] for char in speaker_vocab.trained()]
+    if base:
+        vocabs.append(base)
+    totals = {}
+    for vocab in vocabs:
+        for stats in vocab.prune_stats or []:
+            total = totals.setdefault(stats.level, [0] * 6)
+            for i, value in enumerate(stats[1:]):
+                total[i] += value
+    print("level  contexts before/after  entries before/after  retained mass", file=sys.stderr)
+    for level, total in sorted(totals.items()):
+        print("%5d  %10d %10d  %10d %9d  %13.3f" % (level, *total[:4], total[5] / total[4] if total[4] else 1.0),
+              file=sys.stderr)
@@ -0,0 +1,409 @@
+"""
+A flat model file format for trained vocabularies and grammar states,
+which is memory-mapped rather than read when loaded.
+
+Everything is stored as arrays of 32-bit unsigned ints plus one table of
+strings, so opening a model is constant time, and any number of worker
+processes opening the same file share one copy of it in the page cache.
+
+Each vocabulary's back-off trie (see vocabulary.ContextNode) is stored as
+an array of nodes, with the children of each node stored together and
+sorted so they can be binary searched. Each node has the words seen in that
+context and their cumulative counts, plus the count of any words pruned
+from it. The vocabulary's
+sentences-per-utterance counts are stored the same way.
+
+>>> save_model('doll.model', {'Nora': nora_vocab}, states)
+>>> model = MappedModel('doll.model')
+>>> model.vocabulary('Nora').build_sentence(['DT', 'NN', 'VBZ', 'JJ'])
+"""
+
+import mmap
+import random
+import struct
+from array import array
+from bisect import bisect_right
+from collections import deque
+
+from files import replace_file
+from grammar import State
+from vocabulary import Vocabulary
+
+MAGIC = b'PLAYMDL5'
+BYTE_ORDER_MARK = 0x01020304
+NO_STRING = 0xFFFFFFFF
+
+# magic, byte order mark, then the length of each section
+HEADER = struct.Struct('=8s10I')
+
+# key, first child, number of children, first entry, number of entries,
+# pruned count
+NODE_SIZE = 6
+# name, root node, fallback node (NO_STRING if the vocabulary is empty),
+# first sentence count, number of sentence counts, base vocabulary (or
+# NO_STRING), word order, whether the next tag is used.
+# Base vocabularies are stored after the named ones.
+VOCAB_SIZE = 8
+# name, output, first transition, number of transitions
+STATE_SIZE = 4
+
+
+def _fallback_tag(vocab):
+    # The tag Vocabulary falls back to when the tag to fill is unknown
+    if 'NN' in vocab.root.children:
+        return 'NN'
+    return next(iter(vocab.root.children), None)
+
+
+def _with_bases(vocabularies):
+    # The named vocabularies followed by all of their bases, each only once
+    vocabs = list(vocabularies.values())
+    for vocab in vocabs:
+        if vocab.base is not None and \
+                not any(vocab.base is other for other in vocabs):
+            vocabs.append(vocab.base)
+    return vocabs
+
+
+def _collect_strings(vocabularies, states):
+    strings = set()
+    for name in vocabularies:
+        if name is not None:
+            strings.add(name)
+    pending = [vocab.root for vocab in _with_bases(vocabularies)]
+    while pending:
+        node = pending.pop()
+        if node.counts is not None:
+            strings.update(node.counts.keys())
+        strings.update(node.children.keys())
+        pending.extend(node.children.values())
+    for state in states.values():
+        strings.add(state.pos)
+        strings.add(state.output)
+        strings.update(state.transitions)
+    # Sorting by UTF-8 lets the reader binary search the raw bytes
+    return sorted(strings, key=lambda string: string.encode('utf-8'))
+
+
+def save_model(filename, vocabularies, states=None):
+    """
+    Write trained vocabularies (and optionally grammar states) to a model
+    file that can be opened with MappedModel.
+
+    :param filename: the file to write
+    :param vocabularies: dict mapping a name (e.g. a character, or None for
+     stage directions) to a trained Vocabulary
+    :param states: the states of a grammar, as returned by
+     Grammar.load_machine
+    :raises ValueError: if a vocabulary is a MappedVocabulary
+    """
+    states = states or {}
+    names = list(vocabularies)
+    vocabs = _with_bases(vocabularies)
+    for vocab in vocabs:
+        if isinstance(vocab, MappedVocabulary):
+            raise ValueError('A vocabulary mapped from a model file cannot '
+                             'be saved again, save the one it came from')
+        vocab._assert_trained()
+    strings = _collect_strings(vocabularies, states)
+    string_ids = {string: i for i, string in enumerate(strings)}
+
+    string_offsets = array('I', [0])
+    string_bytes = bytearray()
+    for string in strings:
+        string_bytes += string.encode('utf-8')
+        string_offsets.append(len(string_bytes))
+    string_bytes += b'\0' * (-len(string_bytes) % 4)
+
+    # Lay the nodes out breadth first so that children are contiguous and
+    # sorted by string id, i.e. can be binary searched
+    nodes = array('I')
+    entry_words = array('I')
+    entry_counts = array('I')
+    vocab_table = array('I')
+    length_values = array('I')
+    length_counts = array('I')
+    for index, vocab in enumerate(vocabs):
+        name = names[index] if index < len(names) else None
+        base = NO_STRING
+        if vocab.base is not None:
+            base = next(i for i, other in enumerate(vocabs)
+                        if other is vocab.base)
+        root = vocab.root
+        fallback = root.children.get(_fallback_tag(vocab))
+        vocab_table.extend([NO_STRING if name is None else string_ids[name],
+                            len(nodes) // NODE_SIZE, NO_STRING,
+                            len(length_values), len(vocab.sentence_counts),
+                            base, vocab.word_order, int(vocab.use_next_tag)])
+        vocab_index = len(vocab_table) - 6
+        cumulative = 0
+        for length, count in vocab.sentence_counts.items():
+            cumulative += count
+            length_values.append(length)
+            length_counts.append(cumulative)
+        queue = deque([(NO_STRING, root)])
+        while queue:
+            key, node = queue.popleft()
+            # The children go after this node and everything already queued
+            first_child = len(nodes) // NODE_SIZE + 1 + len(queue)
+            children = sorted(node.children.items(),
+                              key=lambda child: string_ids[child[0]])
+            first_entry = len(entry_words)
+            cumulative = 0
+            for word, count in (node.counts or {}).items():
+                cumulative += count
+                entry_words.append(string_ids[word])
+                entry_counts.append(cumulative)
+            nodes.extend([key, first_child, len(children), first_entry,
+                          len(entry_words) - first_entry, node.pruned])
+            if node is fallback:
+                vocab_table[vocab_index] = len(nodes) // NODE_SIZE - 1
+            for child_key, child in children:
+                queue.append((string_ids[child_key], child))
+
+    state_table = array('I')
+    transitions = array('I')
+    for state in states.values():
+        state_table.extend([string_ids[state.pos], string_ids[state.output],
+                            len(transitions), len(state.transitions)])
+        transitions.extend(string_ids[t] for t in state.transitions)
+
+    header = HEADER.pack(MAGIC, BYTE_ORDER_MARK, len(strings),
+                         len(string_bytes), len(names), len(vocabs),
+                         len(nodes) // NODE_SIZE, len(entry_words),
+                         len(length_values), len(states), len(transitions))
+    # Never truncated in place, since other processes may have it mapped
+    with replace_file(filename) as f:
+        f.write(header)
+        f.write(string_offsets.tobytes())
+        f.write(string_bytes)
+        for table in (vocab_table, nodes, entry_words, entry_counts,
+                      length_values, length_counts, state_table,
+                      transitions):
+            f.write(table.tobytes())
+
+
+class MappedModel:
+    """
+    A model file written by save_model, memory-mapped for reading.
+    Nothing is copied out of the file when it is opened; lookups read the
+    mapped arrays directly.
+    >>> model = MappedModel('doll.model')
+    >>> nora = model.vocabulary('Nora')
+    """
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, byte_order_mark, num_strings, num_string_bytes,
+         self._num_named, num_vocabs, num_nodes, num_entries, num_lengths,
+         num_states, num_transitions) = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or byte_order_mark != BYTE_ORDER_MARK:
+            raise ValueError(filename + ' is not a model file for this '
+                             'machine')
+
+        view = memoryview(self._mmap)
+        offset = HEADER.size
+
+        def section(length, item_format='I'):
+            nonlocal offset
+            size = length * struct.calcsize(item_format)
+            data = view[offset:offset + size].cast(item_format)
+            offset += size
+            return data
+
+        self._string_offsets = section(num_strings + 1)
+        self._string_bytes = section(num_string_bytes, 'B')
+        self._vocabs = section(num_vocabs * VOCAB_SIZE)
+        self._nodes = section(num_nodes * NODE_SIZE)
+        self._entry_words = section(num_entries)
+        self._entry_counts = section(num_entries)
+        self._length_values = section(num_lengths)
+        self._length_counts = section(num_lengths)
+        self._states = section(num_states * STATE_SIZE)
+        self._transitions = section(num_transitions)
+        self._string_ids = {}
+
+    def names(self):
+        """
+        :return: the names of the vocabularies in the model
+        """
+        return [self._string(self._vocabs[i])
+                for i in range(0, self._num_named * VOCAB_SIZE, VOCAB_SIZE)]
+
+    def vocabulary(self, name, rng=random):
+        """
+        :param name: the name the vocabulary was saved under
+        :param rng: the random.Random to draw words from by default
+        :return: the vocabulary as a MappedVocabulary
+        """
+        name_id = NO_STRING if name is None else self._string_id(name)
+        for i in range(0, self._num_named * VOCAB_SIZE, VOCAB_SIZE):
+            if self._vocabs[i] == name_id:
+                return MappedVocabulary(self, i // VOCAB_SIZE, rng)
+        raise KeyError(name)
+
+    def states(self):
+        """
+        :return: the grammar states, as returned by Grammar.load_machine
+        """
+        states = {}
+        for i in range(0, len(self._states), STATE_SIZE):
+            name, output, first, count = self._states[i:i + STATE_SIZE]
+            transitions = [self._string(t)
+                           for t in self._transitions[first:first + count]]
+            states[self._string(name)] = State(self._string(name),
+                                               self._string(output),
+                                               transitions)
+        return states
+
+    def find_nodes(self, node, path):
+        """
+        Follow path down the trie from node, and return the nodes along it
+        which have any words.
+
+        :return: a list of node indexes, the deepest first
+        """
+        nodes = []
+        for key in path:
+            key_id = self._string_id(key)
+            if key_id is None:
+                break
+            node = self._find_child(node, key_id)
+            if node is None:
+                break
+            if self._nodes[node * NODE_SIZE + 4]:
+                nodes.append(node)
+        nodes.reverse()
+        return nodes
+
+    def sample(self, node, rng):
+        """
+        Draw a word from the node's words, weighted by their counts.
+        Given the same rng state this picks the same word as
+        ContextNode.sample does.
+
+        :return: the word, or None if the draw fell on pruned words
+        """
+        first = self._nodes[node * NODE_SIZE + 3]
+        last = first + self._nodes[node * NODE_SIZE + 4]
+        total = self._entry_counts[last - 1]
+        position = rng.random() * (total + self._nodes[node * NODE_SIZE + 5])
+        if position >= total:
+            return None
+        entry = bisect_right(self._entry_counts, position, first, last)
+        return self._string(self._entry_words[entry])
+
+    def sample_sentence_count(self, vocab, rng):
+        """
+        Draw a number of sentences from the vocabulary's sentence counts, the
+        same way as Vocabulary.random_sentence_count.
+        """
+        first = self._vocabs[vocab * VOCAB_SIZE + 3]
+        last = first + self._vocabs[vocab * VOCAB_SIZE + 4]
+        if first == last:
+            return 1
+        position = rng.random() * self._length_counts[last - 1]
+        entry = bisect_right(self._length_counts, position, first, last)
+        return self._length_values[entry]
+
+    def root(self, vocab):
+        """
+        :return: the root node and fallback node of the vocabulary's trie
+        """
+        return (self._vocabs[vocab * VOCAB_SIZE + 1],
+                self._vocabs[vocab * VOCAB_SIZE + 2])
+
+    def base(self, vocab):
+        """
+        :return: the index of the vocabulary's base, or None if it has none
+        """
+        base = self._vocabs[vocab * VOCAB_SIZE + 5]
+        return None if base == NO_STRING else base
+
+    def settings(self, vocab):
+        """
+        :return: the vocabulary's word_order and use_next_tag
+        """
+        return (self._vocabs[vocab * VOCAB_SIZE + 6],
+                bool(self._vocabs[vocab * VOCAB_SIZE + 7]))
+
+    def _find_child(self, node, key_id):
+        first = self._nodes[node * NODE_SIZE + 1]
+        last = first + self._nodes[node * NODE_SIZE + 2]
+        # Children are stored in order of their keys, so binary search
+        low, high = first, last
+        while low < high:
+            middle = (low + high) // 2
+            if self._nodes[middle * NODE_SIZE] < key_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < last and self._nodes[low * NODE_SIZE] == key_id:
+            return low
+        return None
+
+    def _string(self, string_id):
+        if string_id == NO_STRING:
+            return None
+        start = self._string_offsets[string_id]
+        end = self._string_offsets[string_id + 1]
+        return str(self._string_bytes[start:end], 'utf-8')
+
+    def _string_id(self, string):
+        if string not in self._string_ids:
+            self._string_ids[string] = self._search_string(string)
+        return self._string_ids[string]
+
+    def _search_string(self, string):
+        target = string.encode('utf-8')
+        low, high = 0, len(self._string_offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            start = self._string_offsets[middle]
+            end = self._string_offsets[middle + 1]
+            if self._string_bytes[start:end].tobytes() < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self._string_offsets) - 1 and \
+                self._string(low) == string:
+            return low
+        return None
+
+
+class MappedVocabulary(Vocabulary):
+    """
+    A trained vocabulary read from a MappedModel. It generates exactly the
+    same words as the Vocabulary it was saved from, but cannot be trained.
+    """
+
+    def __init__(self, model, index, rng=random):
+        base = model.base(index)
+        if base is not None:
+            base = MappedVocabulary(model, base, rng)
+        word_order, use_next_tag = model.settings(index)
+        super().__init__(rng, word_order=word_order,
+                         use_next_tag=use_next_tag, base=base)
+        self._model = model
+        self._index = index
+        self._root, self._fallback = model.root(index)
+
+    def train(self, utterances):
+        raise RuntimeError('A mapped vocabulary cannot be trained')
+
+    def _random_word(self, previous_words, previous_tag, tag, next_tag, rng):
+        path = self._context_path(previous_words, previous_tag, tag, next_tag)
+        for node in self._model.find_nodes(self._root, path):
+            word = self._model.sample(node, rng)
+            if word is not None:
+                return word
+        if self.base is not None:
+            return self.base._random_word(previous_words, previous_tag, tag,
+                                          next_tag, rng)
+        if self._fallback == NO_STRING:
+            raise RuntimeError('The vocabulary was saved without any words')
+        return self._model.sample(self._fallback, rng)
+
+    def random_sentence_count(self, rng=None):
+        return self._model.sample_sentence_count(self._index, rng or self.rng)
@@ -0,0 +1,190 @@
+"""
+Writing generated plays to sharded, compressed files.
+
+Generating thousands of plays makes a lot of output, and compressing and
+writing it takes about as long as generating it. A ShardedWriter does the
+compressing and writing on a background thread, so generation carries on
+meanwhile, and starts a new file (shard) every shard_size records, so no
+file grows too big and consumers can read several shards at once.
+
+Each shard is named by formatting the filename pattern with its index, and
+compressed by the pattern's extension: ".gz" for gzip, ".zst" for zstd
+(if the zstandard package is installed), or not at all otherwise.
+
+>>> with ShardedWriter('plays/plays-{:04d}.jsonl.gz', shard_size=10000) \\
+...         as writer:
+...     for record in format_jsonl(speeches, acts, seed):
+...         writer.write(record)
+"""
+
+import gzip
+import queue
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_SHARD_SIZE = 100000
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_MAX_PENDING = 16
+
+
+def _open_plain(filename):
+    return open(filename, 'w', encoding='utf-8')
+
+
+def _open_gzip(filename):
+    # A low compression level; the default is several times slower for
+    # output that only gets a little smaller
+    return gzip.open(filename, 'wt', compresslevel=5, encoding='utf-8')
+
+
+def _open_zstd(filename):
+    if zstandard is None:
+        raise ValueError('Writing .zst files needs the zstandard package')
+    return zstandard.open(filename, 'w', encoding='utf-8')
+
+
+COMPRESSIONS = {
+    '.gz': _open_gzip,
+    '.zst': _open_zstd,
+}
+
+
+def open_shard(filename):
+    """
+    :return: a text file open for writing to filename, compressed by its
+     extension (see COMPRESSIONS)
+    """
+    for extension, open_compressed in COMPRESSIONS.items():
+        if filename.endswith(extension):
+            return open_compressed(filename)
+    return _open_plain(filename)
+
+
+def check_pattern(pattern):
+    """
+    :raises ValueError: unless formatting pattern with the index of a shard
+     gives a different filename for each shard
+    """
+    try:
+        different = pattern.format(0) != pattern.format(1)
+    except (IndexError, KeyError, ValueError):
+        different = False
+    if not different:
+        raise ValueError('The shard filename ' + repr(pattern) +
+                         ' needs one format field for the shard index, '
+                         'e.g. {:04d}')
+
+
+class ShardedWriter:
+    """
+    Writes records (strings, e.g. lines of JSON) to a series of files on a
+    background thread, see the module docstring. Records are handed to the
+    thread in batches of batch_size, and at most max_pending batches wait to
+    be written, after which write blocks until the thread catches up.
+    An error writing a shard is raised by the next call to write or close.
+
+    :param pattern: the filename of each shard, with a format field for the
+     index of the shard, e.g. 'plays-{:04d}.jsonl.gz'
+    :param shard_size: the number of records in each shard
+    :raises ValueError: if the pattern has no format field for the index,
+     or a size is less than 1
+    """
+
+    def __init__(self, pattern, shard_size=DEFAULT_SHARD_SIZE,
+                 batch_size=DEFAULT_BATCH_SIZE,
+                 max_pending=DEFAULT_MAX_PENDING):
+        if shard_size < 1 or batch_size < 1:
+            raise ValueError('shard_size and batch_size must be at least 1')
+        check_pattern(pattern)
+        if pattern.endswith('.zst') and zstandard is None:
+            raise ValueError('Writing .zst files needs the zstandard package')
+        self.pattern = pattern
+        self.shard_size = shard_size
+        self.batch_size = batch_size
+        # The names of the shards written so far
+        self.filenames = []
+        self.records = 0
+        self._batch = []
+        self._queue = queue.Queue(max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, record):
+        """
+        Add a record to the output.
+
+        :param record: the text of the record, including any newline
+        """
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self._put(self._batch)
+            self._batch = []
+
+    def close(self):
+        """
+        Write out every record, close the last shard and wait for the thread
+        to finish.
+        """
+        if self._thread is None:
+            return
+        try:
+            if self._batch:
+                self._put(self._batch)
+                self._batch = []
+        finally:
+            # Even if the thread failed, it waits for the end of the batches
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._raise_error()
+
+    def _put(self, batch):
+        self._raise_error()
+        self._queue.put(batch)
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run(self):
+        shard = None
+        in_shard = 0
+        try:
+            while True:
+                batch = self._queue.get()
+                if batch is None:
+                    break
+                start = 0
+                while start < len(batch):
+                    if shard is None or in_shard == self.shard_size:
+                        if shard is not None:
+                            shard.close()
+                        filename = self.pattern.format(len(self.filenames))
+                        shard = open_shard(filename)
+                        self.filenames.append(filename)
+                        in_shard = 0
+                    stop = min(len(batch), start + self.shard_size - in_shard)
+                    shard.write(''.join(batch[start:stop]))
+                    in_shard += stop - start
+                    self.records += stop - start
+                    start = stop
+        except Exception as error:
+            self._error = error
+            # Keep taking batches so that write never blocks for good
+            while self._queue.get() is not None:
+                pass
+        finally:
+            if shard is not None:
+                shard.close()
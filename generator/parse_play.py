@@ -1,5 +1,7 @@
+from array import array
 from bs4 import BeautifulSoup
 import re
+import sys
 
 bracketed_dirs = re.compile("\[(.*?)\]")
 
@@ -24,6 +26,13 @@ def tag_to_char(tag):
 def separate_act_tags(tag):
     return (tag.get('href')[1:], tag.get_text())
 
+#the text a line contributes to its speaker's vocabulary: the spoken line
+#for a character, or the stage directions if nobody speaks it
+def line_utterances(speaker, line, stage_direction):
+    if speaker:
+        return [line] if line is not None else []
+    return stage_direction
+
 class Line:
     """
     Contains information for one line of dialogue in a play, in particular:
@@ -87,31 +96,249 @@ class Line:
         #clean resulting line and return
         return line.lstrip(".").strip()
 
+class LineView:
+    """
+    One line of a PlayData, with the same attributes as a Line:
+    act, speaker, stage_direction (a list) and line.
+    """
+    __slots__ = ('_data', '_index')
+
+    def __init__(self, data, index):
+        self._data = data
+        self._index = index
+
+    @property
+    def act(self):
+        return self._data.act_names[self._data._acts[self._index]]
+
+    @property
+    def speaker(self):
+        return self._data.speaker_names[self._data._speakers[self._index]]
+
+    @property
+    def line(self):
+        if not self._data._has_line[self._index]:
+            return None
+        return self._data._string(self._data._first_string[self._index])
+
+    @property
+    def stage_direction(self):
+        return self._data._directions(self._index)
+
+class PlayData:
+    """
+    The lines of a play, stored by column instead of as a Line object each:
+    the act and speaker of every line are ids in arrays, and all of the
+    text (spoken lines and stage directions) is kept in one string, with
+    each line's text and stage directions at a range of offsets into it.
+    Acts and speakers are interned, so each name is stored once.
+
+    Indexing gives a LineView of one line. Finding the speakers of an act
+    or the lines of a speaker slices the arrays rather than looking at
+    every line.
+    >>> data = PlayData()
+    >>> data.append('act1', 'Nora', 'Is that you, Torvald?', ['Laughing.'])
+    >>> data[0].speaker
+    'Nora'
+    >>> data.speakers_in_act('act1')
+    ['Nora']
+    """
+    __slots__ = ('act_names', 'speaker_names', '_act_ids', '_speaker_ids',
+                 '_acts', '_speakers', '_has_line', '_first_string',
+                 '_string_offsets', '_text', '_pending_text', '_act_runs',
+                 '_by_speaker', '_speaker_starts')
+
+    def __init__(self):
+        #id -> name, and name -> id
+        self.act_names = []
+        self.speaker_names = [None]
+        self._act_ids = {}
+        self._speaker_ids = {None: 0}
+        #one entry per line
+        self._acts = array('I')
+        self._speakers = array('I')
+        self._has_line = array('B')
+        #the line's strings are its spoken line (if it has one) followed by
+        #its stage directions, up to the next line's first string
+        self._first_string = array('I', [0])
+        #string i is self._text[offsets[i]:offsets[i + 1]]
+        self._string_offsets = array('I', [0])
+        self._text = ''
+        self._pending_text = []
+        #act id -> list of [start, stop) ranges of its lines
+        self._act_runs = {}
+        #line indexes grouped by speaker id, built when first needed
+        self._by_speaker = None
+        self._speaker_starts = None
+
+    def __len__(self):
+        return len(self._acts)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('line index out of range')
+        return LineView(self, index)
+
+    def __iter__(self):
+        return (LineView(self, index) for index in range(len(self)))
+
+    def append(self, act, speaker, line, stage_direction):
+        """
+        Add a line to the end of the play.
+        :param act: the act's attribute name
+        :param speaker: the speaking character, or None
+        :param line: the spoken line, or None
+        :param stage_direction: a list of stage directions
+        """
+        act_id = self._intern(act, self.act_names, self._act_ids)
+        speaker_id = self._intern(speaker, self.speaker_names,
+                                  self._speaker_ids)
+        index = len(self)
+        runs = self._act_runs.setdefault(act_id, [])
+        if runs and runs[-1][1] == index:
+            runs[-1][1] = index + 1
+        else:
+            runs.append([index, index + 1])
+        self._acts.append(act_id)
+        self._speakers.append(speaker_id)
+        self._has_line.append(line is not None)
+        for text in ([line] if line is not None else []) + stage_direction:
+            self._pending_text.append(text)
+            self._string_offsets.append(self._string_offsets[-1] + len(text))
+        self._first_string.append(len(self._string_offsets) - 1)
+        self._by_speaker = None
+
+    @classmethod
+    def from_lines(cls, lines):
+        """
+        :param lines: Line objects (or anything with the same attributes)
+        :return: a PlayData of those lines
+        """
+        data = cls()
+        for line in lines:
+            data.append(line.act, line.speaker, line.line,
+                        line.stage_direction)
+        return data
+
+    def speakers_in_act(self, act):
+        """
+        :return: the speaker of each line in the act, in order
+        """
+        act_id = self._act_ids.get(act)
+        if act_id is None:
+            return []
+        return [self.speaker_names[speaker_id]
+                for start, stop in self._act_runs[act_id]
+                for speaker_id in self._speakers[start:stop]]
+
+    def lines_by_speaker(self, speaker):
+        """
+        :return: the spoken lines of the speaker, in order
+        """
+        return [self._string(self._first_string[index])
+                for index in self._speaker_lines(speaker)
+                if self._has_line[index]]
+
+    def stage_directions_by_speaker(self, speaker):
+        """
+        :return: the stage directions of all of the speaker's lines
+         (speaker None for the lines with no speaker), in order
+        """
+        return [direction for index in self._speaker_lines(speaker)
+                for direction in self._directions(index)]
+
+    def utterances(self):
+        """
+        :return: (speaker, text) for everything spoken in the play and every
+         stage direction with no speaker, in the order of the play
+        """
+        for index in range(len(self)):
+            speaker = self.speaker_names[self._speakers[index]]
+            line = self._string(self._first_string[index]) \
+                if self._has_line[index] else None
+            for text in line_utterances(speaker, line, self._directions(index)):
+                yield speaker, text
+
+    def _intern(self, name, names, ids):
+        if name not in ids:
+            ids[name] = len(names)
+            names.append(sys.intern(name))
+        return ids[name]
+
+    def _speaker_lines(self, speaker):
+        speaker_id = self._speaker_ids.get(speaker)
+        if speaker_id is None:
+            return array('I')
+        if self._by_speaker is None:
+            self._index_speakers()
+        start = self._speaker_starts[speaker_id]
+        return self._by_speaker[start:self._speaker_starts[speaker_id + 1]]
+
+    def _index_speakers(self):
+        #counting sort of the line indexes by speaker, so that each
+        #speaker's lines are one slice
+        starts = array('I', [0]) * (len(self.speaker_names) + 1)
+        for speaker_id in self._speakers:
+            starts[speaker_id + 1] += 1
+        for i in range(1, len(starts)):
+            starts[i] += starts[i - 1]
+        by_speaker = array('I', [0]) * len(self)
+        filled = array('I', starts)
+        for index, speaker_id in enumerate(self._speakers):
+            by_speaker[filled[speaker_id]] = index
+            filled[speaker_id] += 1
+        self._by_speaker = by_speaker
+        self._speaker_starts = starts
+
+    def _directions(self, index):
+        first = self._first_string[index] + self._has_line[index]
+        return [self._string(i)
+                for i in range(first, self._first_string[index + 1])]
+
+    def _string(self, string_id):
+        if self._pending_text:
+            self._text += ''.join(self._pending_text)
+            self._pending_text = []
+        return self._text[self._string_offsets[string_id]:
+                          self._string_offsets[string_id + 1]]
+
 class Play:
     """
     Contains information for play, in particular:
     -list of acts; both the tag used in html,
      and the name printed in the script (self.acts)
     -cast of characters in play (self.chars)
-    -list of lines (see Line class) (self.lines)
+    -lines of the play, as a PlayData (self.lines)
+    If on_line is given, it is called with the act, speaker, line and stage
+    directions of each line as soon as that line is parsed.
     >>> play = Play(filename, chartag, stagetag)
     """
 
-    def __init__(self, filename, chartag, stagetag):
+    def __init__(self, filename, chartag, stagetag, on_line=None):
         self._chartag = chartag
         self._stagetag = stagetag
         with open(filename) as f:
             soup = BeautifulSoup(f.read(), 'html.parser')
         self.acts = self.get_acts(soup)
         self.chars = self.get_characters(soup)
-        self.lines = []
+        self.lines = PlayData()
         for act in self.acts:
             act_attr_name = act[0]
             act_start = soup.find(attrs={"name": act_attr_name})
             #find all lines in given act
             line = act_start.find_parent().find_next_sibling("p")
             while line is not None and self.in_act(line):
-                self.lines.append(Line(act_attr_name, line, chartag, stagetag, self.chars))
+                parsed = Line(act_attr_name, line, chartag, stagetag, self.chars)
+                stage_direction = parsed.stage_direction
+                if isinstance(stage_direction, str):
+                    #a line with neither speaker nor stage direction is
+                    #all stage direction
+                    stage_direction = [stage_direction] if stage_direction else []
+                self.lines.append(act_attr_name, parsed.speaker, parsed.line, stage_direction)
+                if on_line:
+                    on_line(act_attr_name, parsed.speaker, parsed.line, stage_direction)
                 line = line.find_next_sibling("p")
         self.chars.add(None)
 
@@ -0,0 +1,182 @@
+"""
+Training all of the vocabularies of a play in one pipelined pass.
+
+Training the usual way parses the whole play first, then tokenizes, tags
+and counts each character's lines in turn. train_play instead runs the
+stages at the same time:
+
+- parsing, in a thread, which puts each line on a bounded queue as soon as
+  it has been parsed
+- tokenizing and tagging, in batches of utterances on a pool of worker
+  processes, so that several batches are tagged at once
+- counting each tagged utterance into its speaker's vocabulary, in the
+  calling thread, as soon as its batch is done
+
+At most max_lines parsed lines and max_pending batches are waiting at any
+time, so a fast stage waits for a slow one instead of buffering the whole
+play. Batches are counted in the order their lines were parsed, so every
+vocabulary ends up exactly the same as one trained with Vocabulary.train
+on the same character's lines.
+
+>>> play, vocabs = train_play('hamlet.htm', 'charname', 'scenedesc',
+...                           workers=4)
+>>> skeleton = PlaySkeleton(play)
+>>> vocabs['Hamlet'].build_sentence(['PRP', 'VBP', 'RB', '.'])
+"""
+
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from parse_play import Play, line_utterances
+from tagging import get_tagger
+from tokenizing import get_tokenizer
+from vocabulary import Vocabulary, tag_utterance
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_MAX_PENDING = 16
+DEFAULT_MAX_LINES = 1024
+
+_DONE = object()
+
+
+class _Stopped(Exception):
+    # Raised in the parsing thread to stop it when training failed
+    pass
+
+
+def _tag_batch(utterances, tagger_name, tokenizer_name):
+    # Runs in a worker process, which loads its own tagger once
+    return [tag_utterance(utterance, tagger_name, tokenizer_name)
+            for utterance in utterances]
+
+
+def train_play(filename, chartag, stagetag, workers=None, executor=None,
+               base=None, batch_size=DEFAULT_BATCH_SIZE,
+               max_pending=DEFAULT_MAX_PENDING, max_lines=DEFAULT_MAX_LINES,
+               **vocab_options):
+    """
+    Parse a play and train a vocabulary for each of its characters (and for
+    its stage directions) at the same time.
+
+    :param filename: the play's html file
+    :param chartag: see Play
+    :param stagetag: see Play
+    :param workers: the number of tagging processes, by default one per CPU
+    :param executor: a concurrent.futures.Executor to tag on instead of
+     starting a new pool, e.g. one shared by a whole corpus of plays
+    :param base: an untrained Vocabulary to also train on every line, and
+     to use as the base of all of the others
+    :param batch_size: the number of utterances each worker tags at once
+    :param max_pending: the most batches being tagged at once
+    :param max_lines: the most parsed lines waiting to be batched
+    :param vocab_options: passed on to each Vocabulary, as in
+     VocabularyRegistry
+    :return: the Play, and a dict of a trained Vocabulary for each of its
+     characters (and None for its stage directions)
+    """
+    tagger = vocab_options.get('tagger') or get_tagger()
+    tokenizer = vocab_options.get('tokenizer') or get_tokenizer()
+    token_cache = vocab_options.get('token_cache')
+    if base is not None:
+        base.start_training()
+        vocab_options['base'] = base
+    vocabs = {}
+
+    def vocabulary(speaker):
+        if speaker not in vocabs:
+            vocabs[speaker] = Vocabulary(**vocab_options)
+            vocabs[speaker].start_training()
+        return vocabs[speaker]
+
+    def count(batch, future):
+        # The tags of the batch's utterances which were not in the cache
+        tagged_misses = iter(future.result() if future else [])
+        for speaker, utterance, tagged_sentences in batch:
+            if tagged_sentences is None:
+                tagged_sentences = next(tagged_misses)
+                if token_cache is not None:
+                    token_cache.put(utterance, tagged_sentences, tagger.name,
+                                    tokenizer.name)
+            vocabulary(speaker).train_tagged(tagged_sentences)
+            if base is not None:
+                base.train_tagged(tagged_sentences)
+
+    pending = deque()
+
+    def submit(batch):
+        misses = [utterance for _, utterance, tagged_sentences in batch
+                  if tagged_sentences is None]
+        future = None
+        if misses:
+            future = executor.submit(_tag_batch, misses, tagger.name,
+                                     tokenizer.name)
+        pending.append((batch, future))
+        while len(pending) > max_pending:
+            count(*pending.popleft())
+
+    lines = queue.Queue(max_lines)
+    stop = threading.Event()
+
+    def on_line(*line):
+        if stop.is_set():
+            raise _Stopped
+        lines.put(line)
+
+    def parse():
+        try:
+            play = Play(filename, chartag, stagetag, on_line=on_line)
+        except Exception as error:
+            lines.put((_DONE, error))
+        else:
+            lines.put((_DONE, play))
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(workers)
+    parser = threading.Thread(target=parse, daemon=True)
+    parsed = False
+    try:
+        parser.start()
+        batch = []
+        while True:
+            item = lines.get()
+            if item[0] is _DONE:
+                play = item[1]
+                parsed = True
+                break
+            act, speaker, line, stage_direction = item
+            for utterance in line_utterances(speaker, line, stage_direction):
+                tagged_sentences = None
+                if token_cache is not None:
+                    tagged_sentences = token_cache.get(utterance, tagger.name,
+                                                       tokenizer.name)
+                batch.append((speaker, utterance, tagged_sentences))
+                if len(batch) == batch_size:
+                    submit(batch)
+                    batch = []
+        if batch:
+            submit(batch)
+        while pending:
+            count(*pending.popleft())
+    finally:
+        if not parsed and parser.is_alive():
+            # Training failed: stop parsing, and take the lines off the
+            # queue so the parser is never left waiting to put one
+            stop.set()
+            while lines.get()[0] is not _DONE:
+                pass
+        parser.join()
+        if own_executor:
+            executor.shutdown()
+    if isinstance(play, Exception):
+        raise play
+
+    if base is not None:
+        base.finish_training()
+    for char in play.chars:
+        vocabulary(char)
+    for vocab in vocabs.values():
+        vocab.finish_training()
+    return play, vocabs
@@ -0,0 +1,39 @@
+"""
+Seeded random number streams.
+
+Every component that makes random choices (speaker chains, grammar
+templates, word choice, speech lengths) takes a random.Random instance.
+make_rng derives an independent stream from a seed and a stream name, so
+e.g. act 3 always gets the same stream no matter how many other acts were
+generated before it, or in which process.
+
+>>> rng = make_rng(42, 'act', 3)
+
+A seed can itself be a tuple of parts, e.g. (42, 'play', 2) for the third
+of several plays generated from the seed 42, which is the same as naming
+those parts first in every stream of that play.
+"""
+
+import random
+
+
+def make_rng(seed, *stream):
+    """
+    Return a random.Random for the named stream of the given seed.
+    The same (seed, stream) always gives the same sequence, and different
+    stream names give unrelated sequences.
+    If seed is None the stream is seeded from the OS, i.e. not reproducible.
+
+    :param seed: an int or str seed, a tuple of them, or None
+    :param stream: any number of values naming the stream, e.g. ('act', 3)
+    :return: a random.Random instance
+    """
+    if seed is None:
+        return random.Random()
+    parts = (seed if isinstance(seed, tuple) else (seed,)) + stream
+    # Each part is prefixed with its length, so no two lists of parts give
+    # the same key (as ('42:1',) and (42, 1) would if they were only joined)
+    key = ''.join('%d:%s' % (len(str(part)), part) for part in parts)
+    # String seeds are hashed with SHA-512 by random.seed, so this is stable
+    # across processes and Python runs (unlike hash()).
+    return random.Random(key)
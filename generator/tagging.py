@@ -0,0 +1,117 @@
+"""
+Part of speech taggers for training vocabularies.
+
+nltk.pos_tag loads the perceptron tagger's model from disk every time it is
+called, which is once per sentence when training. The taggers here load
+their model once per process (on first use), tag a batch of sentences at a
+time, and remember the tags of sentences they have already seen - plays
+repeat short lines like "Hamlet!" or "My lord." all the time.
+
+"perceptron" is nltk's default tagger, and "lookup" is a much faster but
+less accurate unigram tagger trained on the Penn Treebank sample, which
+tags unknown words as nouns.
+
+>>> tagger = get_tagger('lookup')
+>>> tagger.tag_sents([['The', 'cat', 'sat', '.']])
+"""
+
+import threading
+from collections import OrderedDict
+
+import nltk
+
+DEFAULT_TAGGER = 'perceptron'
+DEFAULT_MAX_MEMO = 50000
+
+
+def _load_perceptron():
+    return nltk.tag.PerceptronTagger()
+
+
+def _load_lookup():
+    return nltk.UnigramTagger(nltk.corpus.treebank.tagged_sents(),
+                              backoff=nltk.DefaultTagger('NN'))
+
+
+BACKENDS = {
+    'perceptron': _load_perceptron,
+    'lookup': _load_lookup,
+}
+
+
+class Tagger:
+    """
+    A memoizing wrapper around one of the BACKENDS. The backend is only
+    loaded the first time something is tagged.
+    Safe to share between threads.
+    """
+
+    def __init__(self, name=DEFAULT_TAGGER, max_memo=DEFAULT_MAX_MEMO):
+        if name not in BACKENDS:
+            raise ValueError('Unknown tagger ' + repr(name) + ', expected one '
+                             'of ' + ', '.join(sorted(BACKENDS)))
+        self.name = name
+        self.max_memo = max_memo
+        self.hits = 0
+        self.misses = 0
+        self._backend = None
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    def tag_sents(self, sentences):
+        """
+        :param sentences: a list of sentences, each a list of words
+        :return: for each sentence, a list of (word, tag) tuples
+        """
+        sentences = [tuple(sentence) for sentence in sentences]
+        with self._lock:
+            tagged = [self._memo.get(sentence) for sentence in sentences]
+            for sentence, tagged_sentence in zip(sentences, tagged):
+                if tagged_sentence is not None:
+                    self._memo.move_to_end(sentence)
+        # Tag each new sentence once, even if it is in the batch twice
+        unknown = list(OrderedDict.fromkeys(
+            sentence for sentence, tagged_sentence in zip(sentences, tagged)
+            if tagged_sentence is None))
+        newly_tagged = {}
+        if unknown:
+            results = self._get_backend().tag_sents(map(list, unknown))
+            newly_tagged = {sentence: tuple(tagged_sentence) for
+                            sentence, tagged_sentence in zip(unknown, results)}
+        with self._lock:
+            self._memo.update(newly_tagged)
+            while len(self._memo) > self.max_memo:
+                self._memo.popitem(last=False)
+            self.hits += len(sentences) - len(unknown)
+            self.misses += len(unknown)
+        return [list(tagged_sentence if tagged_sentence is not None
+                     else newly_tagged[sentence])
+                for sentence, tagged_sentence in zip(sentences, tagged)]
+
+    def tag(self, sentence):
+        """
+        :param sentence: a list of words
+        :return: a list of (word, tag) tuples
+        """
+        return self.tag_sents([sentence])[0]
+
+    def _get_backend(self):
+        with self._lock:
+            if self._backend is None:
+                self._backend = BACKENDS[self.name]()
+            return self._backend
+
+
+_taggers = {}
+_taggers_lock = threading.Lock()
+
+
+def get_tagger(name=DEFAULT_TAGGER):
+    """
+    :param name: one of the BACKENDS
+    :return: the Tagger for that backend shared by this whole process
+    """
+    with _taggers_lock:
+        if name not in _taggers:
+            _taggers[name] = Tagger(name)
+        return _taggers[name]
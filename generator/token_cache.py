@@ -0,0 +1,108 @@
+"""
+A cache of tokenized and tagged text, shared between training runs.
+
+Tokenizing and tagging is most of the cost of training a Vocabulary, and
+it only depends on the text itself, so the result for each utterance is
+cached under a hash of its text. Re-training on the same play with a
+different vocabulary setup (or on a corpus that shares some of its text)
+then only tags the text it has not seen before.
+
+Entries are also keyed by the names of the tagger and tokenizer used, so
+that switching either does not return another one's tokens or tags.
+
+The cache keeps at most max_entries utterances, evicting the least
+recently used, and can be saved to and loaded from a file. It is safe to
+share between threads, e.g. by the vocabularies of a VocabularyRegistry.
+
+>>> cache = TokenCache('tokens.cache')
+>>> vocab = Vocabulary(token_cache=cache)
+>>> vocab.train(lines)
+>>> cache.save()
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+from files import replace_file
+
+DEFAULT_MAX_ENTRIES = 100000
+
+
+class TokenCache:
+
+    def __init__(self, filename=None, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        :param filename: file to load the cache from (if it exists) and to
+         save it to, or None to only cache in memory
+        :param max_entries: the most utterances to keep
+        """
+        self.filename = filename
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if filename and os.path.exists(filename):
+            with open(filename, 'rb') as f:
+                self._entries = pickle.load(f)
+            self._evict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, text, tagger='', tokenizer=''):
+        """
+        :param text: the raw text of an utterance
+        :param tagger: the name of the tagger
+        :param tokenizer: the name of the tokenizer
+        :return: its tagged sentences, as a tuple of tuples of (word, tag), or
+         None if it is not in the cache
+        """
+        key = self.key(text, tagger, tokenizer)
+        with self._lock:
+            tagged_sentences = self._entries.get(key)
+            if tagged_sentences is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return tagged_sentences
+
+    def put(self, text, tagged_sentences, tagger='', tokenizer=''):
+        """
+        :param text: the raw text of an utterance
+        :param tagged_sentences: a list of its sentences, each a list of
+         (word, tag) tuples
+        :param tagger: the name of the tagger
+        :param tokenizer: the name of the tokenizer
+        """
+        key = self.key(text, tagger, tokenizer)
+        tagged_sentences = tuple(tuple(sentence)
+                                 for sentence in tagged_sentences)
+        with self._lock:
+            self._entries[key] = tagged_sentences
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def save(self, filename=None):
+        """
+        Write the cache to filename, or to the file it was loaded from.
+        """
+        filename = filename or self.filename
+        with self._lock:
+            entries = OrderedDict(self._entries)
+        with replace_file(filename) as f:
+            pickle.dump(entries, f, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def key(text, tagger='', tokenizer=''):
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16,
+                               person=tagger.encode('utf-8')[:16],
+                               salt=tokenizer.encode('utf-8')[:16]).digest()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
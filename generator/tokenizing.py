@@ -0,0 +1,127 @@
+"""
+Tokenizers for splitting utterances into sentences of words.
+
+"punkt" is nltk's default: the Punkt sentence tokenizer followed by the
+Treebank word tokenizer, which runs a few dozen regular expressions over
+every sentence. "regex" splits sentences with one precompiled regular
+expression and words with another, following the Treebank conventions
+(contractions like "do n't" and "I 'll" are split, punctuation is a token
+of its own) for the kind of text found in plays. It also splits
+contractions written with curly apostrophes ("I’ll") and em-dashes between
+words ("so—and"), as in the Gutenberg texts, which Treebank leaves alone.
+It is several times faster than "punkt".
+
+>>> tokenizer = get_tokenizer('regex')
+>>> tokenizer.tokenize('To be. Or not to be?')
+[['To', 'be', '.'], ['Or', 'not', 'to', 'be', '?']]
+"""
+
+import re
+import threading
+
+import nltk
+
+DEFAULT_TOKENIZER = 'punkt'
+
+
+class PunktTokenizer:
+    """
+    nltk's sent_tokenize followed by word_tokenize
+    """
+    name = 'punkt'
+
+    def tokenize(self, utterance):
+        """
+        :param utterance: raw text
+        :return: a list of its sentences, each a list of words
+        """
+        return [nltk.word_tokenize(sentence)
+                for sentence in nltk.sent_tokenize(utterance)]
+
+
+# Words a full stop does not end a sentence after
+ABBREVIATIONS = ['Mr', 'Mrs', 'Ms', 'Dr', 'St', 'Mme', 'Mlle', 'Messrs',
+                 'Capt', 'Col', 'Gen', 'Lt', 'Rev', 'viz', 'cf', 'vs', 'Jr',
+                 'Sr']
+
+# The end of a sentence: ., ! or ? (with any closing quotes or brackets),
+# then space, then anything but a lowercase letter
+SENTENCE_END = re.compile(r'''([.!?]+['"’”)\]]*)(\s+)(?=[^\sa-z])''')
+ENDS_WITH_ABBREVIATION = re.compile(r'(?<!\w)(?:{})$'.format(
+    '|'.join(ABBREVIATIONS)))
+
+WORD = re.compile(r'''
+    (?<!\w)(?:{abbreviations})\.(?=\s|$)  # Mrs.
+  | \d+(?:[.,:]\d+)+                       # 1,000 3.5 10:30
+  | (?i:can)(?=not\b)                      # can|not
+  | \w+(?=n['’]t\b)                        # do|n't
+  | n['’]t\b
+  | ['’](?:[sSmMdD]|ll|LL|re|RE|ve|VE)\b   # I|'ll Helmer|'s
+  | ['’][tT](?=(?i:is|was|were|will)\b)    # 't|is
+  | \w+(?:['’](?!(?:[sSmMdD]|ll|LL|re|RE|ve|VE)\b)\w+|-\w+)*
+  | \.\.\.|--|[—–]
+  | "
+  | \S
+'''.format(abbreviations='|'.join(ABBREVIATIONS)), re.VERBOSE | re.UNICODE)
+
+
+class RegexTokenizer:
+    """
+    A tokenizer of two precompiled regular expressions, see the module
+    docstring
+    """
+    name = 'regex'
+
+    def tokenize(self, utterance):
+        """
+        :param utterance: raw text
+        :return: a list of its sentences, each a list of words
+        """
+        sentences = []
+        start = 0
+        for end in SENTENCE_END.finditer(utterance):
+            if end.group(1) == '.' and ENDS_WITH_ABBREVIATION.search(
+                    utterance, start, end.start(1)):
+                continue
+            self._add_sentence(sentences, utterance, start, end.end(1))
+            start = end.end(2)
+        self._add_sentence(sentences, utterance, start, len(utterance))
+        return sentences
+
+    @staticmethod
+    def _add_sentence(sentences, utterance, start, end):
+        words = []
+        for match in WORD.finditer(utterance, start, end):
+            word = match.group()
+            if word == '"':
+                # Treebank's opening and closing double quotes
+                opening = match.start() == start or \
+                    utterance[match.start() - 1] in ' \t\n([{<'
+                word = '``' if opening else "''"
+            words.append(word)
+        if words:
+            sentences.append(words)
+
+
+TOKENIZERS = {
+    'punkt': PunktTokenizer,
+    'regex': RegexTokenizer,
+}
+
+_tokenizers = {}
+_tokenizers_lock = threading.Lock()
+
+
+def get_tokenizer(name=DEFAULT_TOKENIZER):
+    """
+    :param name: one of the TOKENIZERS
+    :return: the tokenizer of that name shared by this whole process
+    """
+    with _tokenizers_lock:
+        if name not in _tokenizers:
+            if name not in TOKENIZERS:
+                raise ValueError('Unknown tokenizer ' + repr(name) +
+                                 ', expected one of ' +
+                                 ', '.join(sorted(TOKENIZERS)))
+            _tokenizers[name] = TOKENIZERS[name]()
+        return _tokenizers[name]
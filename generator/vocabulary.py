@@ -1,15 +1,97 @@
+import random
 import re
-from collections import defaultdict
+import sys
+import threading
+from bisect import bisect_right
+from collections import namedtuple
+from heapq import nlargest
+from itertools import accumulate
+from operator import itemgetter
 from typing import List, Dict, Tuple
 
 import nltk
 
+from tagging import DEFAULT_TAGGER, get_tagger
+from tokenizing import DEFAULT_TOKENIZER, get_tokenizer
+
 START_SENTENCE = '<s>'
 END_SENTENCE = '</s>'
 
 USE_NEXT_TAG = True
 
 
+class PruneStats(namedtuple('PruneStats', [
+        'level', 'contexts_before', 'contexts_after', 'entries_before',
+        'entries_after', 'count_before', 'count_after'])):
+    """
+    The size of one level of the back-off trie before and after pruning,
+    see Vocabulary.prune
+    """
+    __slots__ = ()
+
+    @property
+    def retained_mass(self):
+        """
+        The share of the level's counts that were kept
+        """
+        if not self.count_before:
+            return 1.0
+        return self.count_after / self.count_before
+
+
+def _sample(freq_dist, rng):
+    # Draw from a FreqDist weighted by its counts. Works on integer counts so
+    # that a given draw always picks the same sample.
+    position = rng.random() * freq_dist.N()
+    for sample, count in freq_dist.items():
+        position -= count
+        if position < 0:
+            return sample
+    return sample
+
+
+class ContextNode:
+    """
+    A node in a vocabulary's back-off trie. The path from the root to a node
+    is a context, e.g. (tag, previous tag, next tag, previous word), and the
+    node counts the words seen in that context. Each node's parent is the
+    context to back off to, so all levels of back-off share one structure.
+    Nodes whose counts are kept in a base vocabulary have counts None.
+    """
+    __slots__ = ('counts', 'children', 'cumulative', 'pruned')
+
+    def __init__(self):
+        self.counts: nltk.FreqDist = None
+        self.children: Dict[str, 'ContextNode'] = {}
+        # (words, cumulative counts), built the first time it is sampled
+        self.cumulative: Tuple[Tuple[str], List[int]] = None
+        # How many occurrences were pruned from counts, see Vocabulary.prune
+        self.pruned = 0
+
+    def child(self, key):
+        if key not in self.children:
+            self.children[sys.intern(key)] = ContextNode()
+        return self.children[key]
+
+    def sample(self, rng):
+        """
+        Draw a word weighted by its count, in O(log n).
+        Unless words were pruned, picks the same word as
+        _sample(self.counts, rng) would.
+
+        :return: the word, or None if the draw fell on the pruned words (in
+         which case the caller should back off to the parent context)
+        """
+        if self.cumulative is None:
+            self.cumulative = (tuple(self.counts.keys()),
+                               list(accumulate(self.counts.values())))
+        words, cumulative = self.cumulative
+        position = rng.random() * (cumulative[-1] + self.pruned)
+        if position >= cumulative[-1]:
+            return None
+        return words[bisect_right(cumulative, position)]
+
+
 class Vocabulary:
     """
     A trainable vocabulary which can populate sentences given the tag sequence
@@ -24,23 +106,67 @@ class Vocabulary:
     >>> vocab.build_sentence(['DT', 'NN', 'VBZ', 'JJ', 'NNS'])
     >>> 'Some text has many sentences.'
 
-    """
+    Words are drawn from rng (a random.Random), or from the global random
+    module if none is given. Pass a seeded one for reproducible output.
 
-    def __init__(self):
-        self.labels_by_features: Dict[Tuple, List[str]] = None
-        self.labels_by_tags: Dict[Tuple, List[str]] = None
-        self.labels_by_prev_tag: Dict[Tuple, List[str]] = None
-        self.labels_by_tag: Dict[str, List[str]] = None
+    Text is split into sentences and words by tokenizer (see tokenizing.py),
+    by default nltk's, and tagged with tagger (see tagging.py), by default
+    the process-wide perceptron tagger. If a TokenCache is given, tokenized
+    and tagged text is looked up in and added to it, so text seen before is
+    never tagged again.
 
-        self.freqs_by_features: Dict[Tuple, nltk.FreqDist] = None
-        self.freqs_by_tags: Dict[Tuple, nltk.FreqDist] = None
-        self.freqs_by_prev_tag: Dict[Tuple, nltk.FreqDist] = None
-        self.freqs_by_tag: Dict[str, nltk.FreqDist] = None
+    Words are chosen based on their context: the tag to fill, the previous
+    tag, the next tag (if use_next_tag is set) and the previous word_order
+    words. If a context was never seen in training, the vocabulary backs off
+    to a shorter one, dropping first the earliest word, then the next tag
+    and finally the previous tag.
 
-        self.probs_by_features: Dict[Tuple, nltk.MLEProbDist] = None
-        self.probs_by_tags: Dict[Tuple, nltk.MLEProbDist] = None
-        self.probs_by_prev_tag: Dict[Tuple, nltk.MLEProbDist] = None
-        self.probs_by_tag: Dict[str, nltk.MLEProbDist] = None
+    Vocabularies trained on parts of one corpus (e.g. the characters of one
+    play) can share a base vocabulary trained on all of it. Then each
+    vocabulary only keeps counts for contexts with previous words, and looks
+    up contexts of just tags in the base, which saves repeating the tag
+    contexts (and their words) for every character.
+
+    >>> base = Vocabulary()
+    >>> base.train(all_lines)
+    >>> nora = Vocabulary(base=base)
+    >>> nora.train(lines_by_nora)
+
+    To bound the size of a vocabulary trained on a big corpus, give
+    min_counts and/or top_k, and it is pruned at the end of training (see
+    prune). prune_stats then has a PruneStats for each level of contexts.
+
+    >>> vocab = Vocabulary(min_counts=[1, 1, 2, 2, 3], top_k=100)
+
+    A trained vocabulary can be updated when its corpus changes, by taking
+    out the utterances that are gone and counting the new ones (see update),
+    as long as it was not pruned.
+
+    """
+
+    def __init__(self, rng=random, token_cache=None, word_order=1,
+                 use_next_tag=USE_NEXT_TAG, tagger=None, base=None,
+                 min_counts=None, top_k=None, tokenizer=None):
+        if word_order < 0:
+            raise ValueError('word_order cannot be negative, got %d'
+                             % word_order)
+        self.rng = rng
+        self.base: Vocabulary = base
+        self.token_cache = token_cache
+        self.tagger = tagger or get_tagger()
+        self.tokenizer = tokenizer or get_tokenizer()
+        self.word_order = word_order
+        self.use_next_tag = use_next_tag
+        self.min_counts = min_counts
+        self.top_k = top_k
+        self.prune_stats: List[PruneStats] = None
+
+        # The root of the back-off trie, see ContextNode
+        self.root: ContextNode = None
+
+        # How many sentences each utterance had, e.g. for picking how many
+        # sentences a generated speech should have
+        self.sentence_counts: nltk.FreqDist = nltk.FreqDist()
 
     def train(self, utterances: List[str]):
         """
@@ -50,15 +176,138 @@ class Vocabulary:
         stream of sentences. However, passing in a list containing a single
         string with all the data works equally well.
 
-        :param utterances: a list of utterances, i.e. a list of raw text strings
+        :param utterances: a list of utterances, i.e. a list of raw text
+         strings
         :return: (the vocabulary updates its state)
         """
-        self._populate_labelled_features(utterances)
-        self._create_freqs()
-        self._create_probabilities()
-        self._clear_labelled_features()  # Tidy up to save memory
+        self.start_training()
+        # Count each word straight into the trie as it is tagged, so nothing
+        # bigger than one utterance is held besides the counts themselves
+        for utterance in utterances:
+            self.train_tagged(self._tag_by_sentence(utterance))
+        self.finish_training()
+
+    def start_training(self):
+        """
+        Forget everything counted so far. Together with train_tagged and
+        finish_training, this trains the vocabulary on utterances tagged
+        elsewhere, e.g. by another process (see pipeline.py):
+
+        >>> vocab.start_training()
+        >>> for tagged_sentences in tagged_utterances:
+        >>>     vocab.train_tagged(tagged_sentences)
+        >>> vocab.finish_training()
+        """
+        self.root = ContextNode()
+        self.sentence_counts = nltk.FreqDist()
+        self.prune_stats = None
+
+    def train_tagged(self, tagged_sentences):
+        """
+        Count one utterance.
+
+        :param tagged_sentences: the utterance's sentences, each a list of
+         (word, tag) tuples, e.g. as returned by tag_utterance
+        """
+        self._count_tagged_sentences(tagged_sentences)
+
+    def update(self, added=(), removed=()):
+        """
+        Update a trained vocabulary for a change to its corpus, without
+        training it again on all of it. The counts are then the same as
+        if it had been trained on the new corpus, though words may be kept
+        in a different order, so a seeded rng can draw different ones.
+        A pruned vocabulary cannot be updated, since the counts of the
+        words dropped from it are lost.
+
+        :param added: the utterances (raw text strings) added to the corpus
+        :param removed: the utterances removed from it, each of which it
+         must have been trained on
+        """
+        self._assert_trained()
+        if self.prune_stats is not None:
+            raise RuntimeError('A pruned vocabulary cannot be updated, '
+                               'train it again instead')
+        for utterance in removed:
+            self.untrain_tagged(self._tag_by_sentence(utterance))
+        for utterance in added:
+            self.train_tagged(self._tag_by_sentence(utterance))
+
+    def untrain_tagged(self, tagged_sentences):
+        """
+        Take out one utterance counted before by train_tagged.
 
-    def build_sentence(self, tag_sequence: List[str]):
+        :param tagged_sentences: the utterance's sentences, each a list of
+         (word, tag) tuples
+        """
+        self._count_tagged_sentences(tagged_sentences, -1)
+
+    def finish_training(self):
+        """
+        Prune the vocabulary, if it was set up to be, once every utterance
+        has been counted.
+        """
+        if self.min_counts or self.top_k:
+            self.prune_stats = self.prune(self.min_counts, self.top_k)
+
+    def prune(self, min_counts=None, top_k=None):
+        """
+        Drop rarely seen words from each context, and contexts left without
+        any words.
+
+        The count of the words dropped from a context is kept, so that
+        sampling that context backs off to the next shorter one as often as
+        it would have drawn one of the dropped words. Contexts of just the
+        tag have nothing to back off to, so they always keep their most
+        common word, and the rest of their words are simply renormalised.
+
+        :param min_counts: the least count a word needs to be kept, for each
+         level of contexts: first for the tag only, then the previous tag,
+         then the next tag (if used), then each previous word. Levels past
+         the end of the list are not pruned by count.
+        :param top_k: the most words to keep in any one context
+        :return: a list with a PruneStats for each level
+        """
+        self._assert_trained()
+        min_counts = min_counts or []
+        levels = []
+        level = [(self.root, None, self.root)]
+        while True:
+            level = [(node, key, child) for _, _, node in level
+                     for key, child in node.children.items()]
+            if not level:
+                break
+            levels.append(level)
+
+        stats = []
+        # Deepest first, so that a context whose children were all removed
+        # can be removed too
+        for depth in reversed(range(len(levels))):
+            min_count = min_counts[depth] if depth < len(min_counts) else 0
+            contexts_before = contexts_after = 0
+            entries_before = entries_after = 0
+            count_before = count_after = 0
+            for parent, key, node in levels[depth]:
+                if node.counts is not None:
+                    contexts_before += 1
+                    entries_before += len(node.counts)
+                    count_before += node.counts.N()
+                    self._prune_node(node, min_count, top_k,
+                                     keep_one=depth == 0)
+                if node.counts is None and not node.children:
+                    del parent.children[key]
+                    continue
+                if node.counts is not None:
+                    contexts_after += 1
+                    entries_after += len(node.counts)
+                    count_after += node.counts.N()
+            stats.append(PruneStats(depth, contexts_before, contexts_after,
+                                    entries_before, entries_after,
+                                    count_before, count_after))
+        stats.reverse()
+        return stats
+
+    def build_sentence(self, tag_sequence: List[str], rng=None):
         """
         Populate a syntactic tree given by the sequence of its terminal nodes,
         and return that as a sentence.
@@ -66,24 +315,26 @@ class Vocabulary:
         END_SENTENCE, these will be added.
 
         :param tag_sequence: the sequence of tags to fill
+        :param rng: the random.Random to draw words from (default: self.rng)
         :return: a sentence as a string (capitalised and with a period).
         """
-        words = self.tags_to_random_words(tag_sequence)
+        words = self.tags_to_random_words(tag_sequence, rng)
         words[0] = words[0].capitalize()
         sentence = ' '.join(words)
         sentence = re.sub(r'\s([,;:])', r'\1', sentence)
         sentence += '.'
         return sentence
 
-    def tags_to_random_words(self, tag_sequence: List[str]):
+    def tags_to_random_words(self, tag_sequence: List[str], rng=None):
         """
         Map a list of terminal nodes of a syntactic tree / a sequence of tags
         to a sequence of words corresponding to those tags
 
         :param tag_sequence: the sequence of tags to fill
+        :param rng: the random.Random to draw words from (default: self.rng)
         :return: a list of words, lowercased.
         """
-        words = []
+        words = [START_SENTENCE]
         if tag_sequence[0] != START_SENTENCE:
             tag_sequence.insert(0, START_SENTENCE)
         if tag_sequence[-1] != END_SENTENCE:
@@ -91,145 +342,350 @@ class Vocabulary:
         for prev_tag, tag, next_tag in zip(tag_sequence[:-2],
                                            tag_sequence[1:-1],
                                            tag_sequence[2:]):
-            prev_word = words[-1] if len(words) > 0 else START_SENTENCE
-            words.append(self.random_word(prev_word, prev_tag, tag, next_tag))
-        return words
+            words.append(self._random_word(words, prev_tag, tag, next_tag,
+                                           rng or self.rng))
+        return words[1:]
 
     def random_word(self, previous_word: str, previous_tag: str, tag: str,
-                    next_tag: str):
+                    next_tag: str, rng=None):
         """
         Return a randomly generated word of the specified category that is
         known to follow the previous tag. Chooses from words in the training
         corpus, based on their relative frequencies. (Higher frequency words
         are more likely to be returned.)
 
-        :param previous_word: the previous word (use START_SENTENCE if none)
+        :param previous_word: the previous word (use START_SENTENCE if none),
+         or a list of the previous words, most recent last
         :param previous_tag: the tag of the previous word
          (use START_SENTENCE if none)
         :param tag: the tag to fill
         :param next_tag: the tag following this word (use END_SENTENCE if none)
+        :param rng: the random.Random to draw from (default: self.rng)
         :return: a randomly chosen word that fits this situation
         """
-        self._assert_trained()
-        prob_dist = self._get_best_prob_dist(previous_word, previous_tag, tag,
-                                             next_tag)
-        return prob_dist.generate()
+        previous_words = [previous_word] if isinstance(previous_word, str) \
+            else previous_word
+        return self._random_word(previous_words, previous_tag, tag, next_tag,
+                                 rng or self.rng)
 
-    def _populate_labelled_features(self, utterances):
-        self.labels_by_features = defaultdict(list)
-        self.labels_by_tags = defaultdict(list)
-        self.labels_by_prev_tag = defaultdict(list)
-        self.labels_by_tag = defaultdict(list)
+    def random_sentence_count(self, rng=None):
+        """
+        Return a number of sentences for an utterance, chosen with the same
+        frequencies as the number of sentences per utterance in the training
+        corpus. Utterances without any sentences are not counted, and an
+        untrained vocabulary always returns 1.
 
-        for utterance in utterances:
-            sentences = self._tokenize_by_sentence(utterance)
-            for sentence in sentences:
-                tagged_sentence: List[Tuple] = nltk.pos_tag(
-                    sentence)
-
-                tagged_sentence.insert(0, (START_SENTENCE, START_SENTENCE))
-                if tagged_sentence[-1][1] == '.':
-                    # Remove last period since we're using END_SENTENCE
-                    tagged_sentence[-1:] = []
-                tagged_sentence.append((END_SENTENCE, END_SENTENCE))
-
-                # Ignore last item as it will always be punctuation
-                for prev_tagged_word, tagged_word, (next_word, next_tag) \
-                        in zip(tagged_sentence[:-2], tagged_sentence[1:-1],
-                               tagged_sentence[2:]):
-                    self._add_to_labelled_features(tagged_word,
-                                                   prev_tagged_word, next_tag)
+        :param rng: the random.Random to draw from (default: self.rng)
+        :return: a number of sentences, at least 1
+        """
+        if not self.sentence_counts:
+            return 1
+        return _sample(self.sentence_counts, rng or self.rng)
+
+    def _random_word(self, previous_words, previous_tag, tag, next_tag, rng):
+        self._assert_trained()
+        nodes = self._get_context_nodes(
+            self._context_path(previous_words, previous_tag, tag, next_tag))
+        for node in nodes:
+            word = node.sample(rng)
+            if word is not None:
+                return word
+        if self.base is not None:
+            return self.base._random_word(previous_words, previous_tag, tag,
+                                          next_tag, rng)
+        return self._get_fallback_node().sample(rng)
+
+    def _count_tagged_sentences(self, tagged_sentences, delta=1):
+        # Count the words of one utterance, given as its tagged sentences,
+        # or with delta -1 take them back out
+        if tagged_sentences:
+            self.sentence_counts[len(tagged_sentences)] += delta
+            if not self.sentence_counts[len(tagged_sentences)]:
+                del self.sentence_counts[len(tagged_sentences)]
+        for tagged_sentence in tagged_sentences:
+            # Copy, since the cached sentence must not be changed
+            tagged_sentence: List[Tuple] = list(tagged_sentence)
+
+            tagged_sentence.insert(0, (START_SENTENCE, START_SENTENCE))
+            if tagged_sentence[-1][1] == '.':
+                # Remove last period since we're using END_SENTENCE
+                tagged_sentence[-1:] = []
+            tagged_sentence.append((END_SENTENCE, END_SENTENCE))
+
+            # Ignore last item as it will always be punctuation
+            previous_words = []
+            for prev_tagged_word, tagged_word, (next_word, next_tag) \
+                    in zip(tagged_sentence[:-2], tagged_sentence[1:-1],
+                           tagged_sentence[2:]):
+                previous_words.append(prev_tagged_word[0])
+                self._count_word(tagged_word, prev_tagged_word, next_tag,
+                                 previous_words, delta)
+
+    @staticmethod
+    def _prune_node(node, min_count, top_k, keep_one):
+        counts = node.counts
+        kept = [(word, count) for word, count in counts.items()
+                if count >= min_count]
+        if top_k is not None and len(kept) > top_k:
+            # Keep the order the words were counted in, so the result does
+            # not depend on how ties are broken
+            top = set(word for word, _ in
+                      nlargest(top_k, kept, key=itemgetter(1)))
+            kept = [(word, count) for word, count in kept if word in top]
+        if not kept and keep_one:
+            kept = counts.most_common(1)
+        if len(kept) == len(counts):
+            return
+        node.cumulative = None
+        if not kept:
+            node.counts = None
+            return
+        pruned_counts = nltk.FreqDist(dict(kept))
+        if not keep_one:
+            node.pruned += counts.N() - pruned_counts.N()
+        node.counts = pruned_counts
+
+    def _tag_by_sentence(self, utterance):
+        if self.token_cache is not None:
+            tagged_sentences = self.token_cache.get(
+                utterance, self.tagger.name, self.tokenizer.name)
+            if tagged_sentences is not None:
+                return tagged_sentences
+        tagged_sentences = self.tagger.tag_sents(
+            self._tokenize_by_sentence(utterance))
+        if self.token_cache is not None:
+            self.token_cache.put(utterance, tagged_sentences, self.tagger.name,
+                                 self.tokenizer.name)
+        return tagged_sentences
 
     def _tokenize_by_sentence(self, utterance):
-        raw_sentences = nltk.sent_tokenize(utterance)
-        sentences: List[str] = [nltk.word_tokenize(sentence)
-                                for sentence in raw_sentences]
-        return sentences
+        return self.tokenizer.tokenize(utterance)
 
-    def _add_to_labelled_features(self, tagged_word, prev_tagged_word,
-                                  next_tag):
+    def _count_word(self, tagged_word, prev_tagged_word, next_tag,
+                    previous_words, delta=1):
         tag = tagged_word[1]
         # Assume that capitalised words are proper names unless they
-        # are at the start of a sentence
-        word = tagged_word[0].lower() \
-            if prev_tagged_word[1] == START_SENTENCE else tagged_word[0]
+        # are at the start of a sentence. Interned, since the same few
+        # thousand words are counted over and over.
+        word = sys.intern(tagged_word[0].lower()
+                          if prev_tagged_word[1] == START_SENTENCE
+                          else tagged_word[0])
 
-        # This won't be output so keep this lowercased
-        prev_word = prev_tagged_word[0].lower()
         prev_tag = prev_tagged_word[1]
-        features = (prev_word, prev_tag, tag, next_tag) if USE_NEXT_TAG \
-            else (prev_word, prev_tag, tag)
-        self.labels_by_features[features].append(word)
-        if USE_NEXT_TAG:
-            self.labels_by_tags[(prev_tag, tag, next_tag)].append(word)
-        self.labels_by_prev_tag[(prev_tag, tag)].append(word)
-        self.labels_by_tag[tag].append(word)
-
-    def _clear_labelled_features(self):
-        self.labels_by_features = None
-        self.labels_by_tag = None
-        self.labels_by_prev_tag = None
-        self.labels_by_tag = None
-
-    def _create_freqs(self):
-        self.freqs_by_features = {features: nltk.FreqDist(labels)
-                                  for (features, labels) in
-                                  self.labels_by_features.items()}
-        if USE_NEXT_TAG:
-            self.freqs_by_tags = {features: nltk.FreqDist(labels)
-                                  for (features, labels) in
-                                  self.labels_by_tags.items()}
-        self.freqs_by_prev_tag = {features: nltk.FreqDist(labels)
-                                  for (features, labels) in
-                                  self.labels_by_prev_tag.items()}
-        self.freqs_by_tag = {tag: nltk.FreqDist(labels)
-                             for (tag, labels) in
-                             self.labels_by_tag.items()}
-
-    def _create_probabilities(self):
-        self.probs_by_features = {features: nltk.MLEProbDist(freq_dist)
-                                  for (features, freq_dist)
-                                  in self.freqs_by_features.items()}
-        if USE_NEXT_TAG:
-            self.probs_by_tags = {features: nltk.MLEProbDist(freq_dist)
-                                  for (features, freq_dist)
-                                  in self.freqs_by_tags.items()}
-        self.probs_by_prev_tag = {prev_features: nltk.MLEProbDist(freq_dist)
-                                  for (prev_features, freq_dist) in
-                                  self.freqs_by_prev_tag.items()}
-        self.probs_by_tag = {tag: nltk.MLEProbDist(freq_dist)
-                             for (tag, freq_dist) in
-                             self.freqs_by_tag.items()}
-
-    def _get_best_prob_dist(self, prev_word, prev_tag, tag, next_tag):
-        # We only use lowercase for lookup
-        prev_word = prev_word.lower()
-
-        features = (prev_word, prev_tag, tag, next_tag) if USE_NEXT_TAG \
-            else (prev_word, prev_tag, tag)
-        if features \
-                in self.probs_by_features.keys():
-            prob_dist = self.probs_by_features[
-                features]
-        elif USE_NEXT_TAG and (prev_tag, tag, next_tag) in self.probs_by_tags.keys():
-            # Try just the tags
-            prob_dist = self.probs_by_tags[(prev_tag, tag, next_tag)]
-        elif (prev_tag, tag) in self.probs_by_prev_tag.keys():
-            # Try just the tag plus previous tag
-            prob_dist = self.probs_by_prev_tag[(prev_tag, tag)]
-        elif tag in self.probs_by_tag.keys():
-            # Try just the current tag
-            prob_dist = self.probs_by_tag[tag]
-        elif 'NN' in self.probs_by_tag.keys():
+        context = self._context_path(previous_words, prev_tag, tag, next_tag)
+        # Every prefix of a context is a context to back off to, so count
+        # the word at every node along its path, except for the contexts
+        # kept in the base vocabulary
+        shared_depth = self._tags_depth() if self.base is not None else 0
+        if delta < 0:
+            self._uncount_word(word, context, shared_depth)
+            return
+        node = self.root
+        for key in context[:shared_depth]:
+            node = node.child(key)
+        for key in context[shared_depth:]:
+            node = node.child(key)
+            counts = node.counts
+            if counts is None:
+                counts = node.counts = nltk.FreqDist()
+            counts[word] += 1
+            node.cumulative = None
+
+    def _uncount_word(self, word, context, shared_depth):
+        # Undo _count_word, removing the contexts left without any words so
+        # the trie is the same as if the word had never been counted
+        path = [(None, self.root)]
+        for key in context:
+            path.append((key, path[-1][1].children[key]))
+        for depth, (key, node) in enumerate(path[1:], 1):
+            if depth <= shared_depth:
+                continue
+            node.counts[word] -= 1
+            if not node.counts[word]:
+                del node.counts[word]
+                if not node.counts:
+                    node.counts = None
+            node.cumulative = None
+        for depth in reversed(range(1, len(path))):
+            key, node = path[depth]
+            if node.counts is None and not node.children:
+                del path[depth - 1][1].children[key]
+
+    def _tags_depth(self):
+        # How many levels of the trie are contexts of just tags
+        return 3 if self.use_next_tag else 2
+
+    def _context_path(self, previous_words, prev_tag, tag, next_tag):
+        # The path through the trie for a context: most general first, so
+        # each prefix is the context to back off to
+        path = (tag, prev_tag, next_tag) if self.use_next_tag \
+            else (tag, prev_tag)
+        if self.word_order:
+            # Previous words are only used lowercase, most recent first
+            words = [START_SENTENCE] * self.word_order + \
+                [word.lower() for word in previous_words[-self.word_order:]]
+            path += tuple(reversed(words[-self.word_order:]))
+        return path
+
+    def _get_context_nodes(self, path):
+        # The contexts along the path that were seen in training, most
+        # specific first
+        nodes = []
+        node = self.root
+        for key in path:
+            node = node.children.get(key)
+            if node is None:
+                break
+            if node.counts is not None:
+                nodes.append(node)
+        nodes.reverse()
+        return nodes
+
+    def _get_fallback_node(self):
+        if 'NN' in self.root.children:
             # Fall back to assuming the unknown tag is a noun
-            prob_dist = self.probs_by_tag['NN']
+            return self.root.children['NN']
+        # Our training data was terrible! Just grab something
+        return next(iter(self.root.children.values()))
+
+    def _nodes_at_depth(self, depth):
+        # (path, node) for every context of the given length
+        level = [((), self.root)]
+        for i in range(depth):
+            level = [(path + (key,), child) for path, node in level
+                     for key, child in node.children.items()]
+        return level
+
+    @property
+    def freqs_by_features(self) -> Dict[Tuple, nltk.FreqDist]:
+        """
+        Word counts by (previous word, previous tag, tag, next tag), or by
+        (previous word, previous tag, tag) if not using the next tag
+        """
+        if self.root is None or not self.word_order:
+            return None
+        features = {}
+        if self.use_next_tag:
+            for (tag, prev_tag, next_tag, prev_word), node \
+                    in self._nodes_at_depth(4):
+                features[(prev_word, prev_tag, tag, next_tag)] = node.counts
         else:
-            # Our training data was terrible! Just grab something
-            some_tag = list(self.probs_by_tag.keys())[0]
-            prob_dist = self.probs_by_tag[some_tag]
-        return prob_dist
+            for (tag, prev_tag, prev_word), node in self._nodes_at_depth(3):
+                features[(prev_word, prev_tag, tag)] = node.counts
+        return features
+
+    @property
+    def freqs_by_tags(self) -> Dict[Tuple, nltk.FreqDist]:
+        """
+        Word counts by (previous tag, tag, next tag)
+        """
+        if self.root is None or not self.use_next_tag:
+            return None
+        if self.base is not None:
+            return self.base.freqs_by_tags
+        return {(prev_tag, tag, next_tag): node.counts
+                for (tag, prev_tag, next_tag), node
+                in self._nodes_at_depth(3)}
+
+    @property
+    def freqs_by_prev_tag(self) -> Dict[Tuple, nltk.FreqDist]:
+        """
+        Word counts by (previous tag, tag)
+        """
+        if self.root is None:
+            return None
+        if self.base is not None:
+            return self.base.freqs_by_prev_tag
+        return {(prev_tag, tag): node.counts
+                for (tag, prev_tag), node in self._nodes_at_depth(2)}
+
+    @property
+    def freqs_by_tag(self) -> Dict[str, nltk.FreqDist]:
+        """
+        Word counts by tag
+        """
+        if self.root is None:
+            return None
+        if self.base is not None:
+            return self.base.freqs_by_tag
+        return {tag: node.counts for tag, node in self.root.children.items()}
 
     def _assert_trained(self):
-        if self.probs_by_features is None:
+        if self.root is None:
             raise RuntimeError('You need to train the vocabulary on a corpus '
                                'before you can call this method')
+
+
+def tokenize_by_sentence(utterance, tokenizer_name=DEFAULT_TOKENIZER):
+    """
+    :param utterance: raw text
+    :param tokenizer_name: one of tokenizing.TOKENIZERS
+    :return: a list of its sentences, each a list of words
+    """
+    return get_tokenizer(tokenizer_name).tokenize(utterance)
+
+
+def tag_utterance(utterance, tagger_name=DEFAULT_TAGGER,
+                  tokenizer_name=DEFAULT_TOKENIZER):
+    """
+    Tokenize and tag an utterance the same way Vocabulary.train does, with
+    this process's tokenizer and tagger of the given names.
+
+    :return: a list of its sentences, each a list of (word, tag) tuples
+    """
+    return get_tagger(tagger_name).tag_sents(
+        tokenize_by_sentence(utterance, tokenizer_name))
+
+
+class VocabularyRegistry:
+    """
+    A vocabulary for each of a set of names (e.g. the characters of a play),
+    each trained the first time it is asked for. This way only the
+    vocabularies which are actually used are ever trained.
+    Safe to use from several threads; each vocabulary is trained only once.
+
+    >>> vocabs = VocabularyRegistry(playskeleton.chars)
+    >>> vocabs['Nora'].build_sentence(['DT', 'NN', 'VBZ', 'JJ'])
+
+    :param utterances_by_name: dict mapping each name to the utterances to
+     train its vocabulary on
+    :param vocab_options: keyword arguments for each Vocabulary
+    """
+
+    def __init__(self, utterances_by_name: Dict[str, List[str]],
+                 **vocab_options):
+        self._utterances_by_name = utterances_by_name
+        self._vocab_options = vocab_options
+        self._vocabs: Dict[str, Vocabulary] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        if name in self._vocabs:
+            return self._vocabs[name]
+        if name not in self._utterances_by_name:
+            raise KeyError(name)
+        with self._lock:
+            name_lock = self._locks.setdefault(name, threading.Lock())
+        # Only lock this name, so other vocabularies can train meanwhile
+        with name_lock:
+            if name not in self._vocabs:
+                vocab = Vocabulary(**self._vocab_options)
+                vocab.train(self._utterances_by_name[name])
+                self._vocabs[name] = vocab
+        return self._vocabs[name]
+
+    def __contains__(self, name):
+        return name in self._utterances_by_name
+
+    def __iter__(self):
+        return iter(self._utterances_by_name)
+
+    def __len__(self):
+        return len(self._utterances_by_name)
+
+    def trained(self):
+        """
+        :return: the names whose vocabularies have been trained so far
+        """
+        return list(self._vocabs)
@@ -0,0 +1,125 @@
+"""
+Writes synthetic plays in the same html structure as the plays in
+source_plays/, at any size, for benchmarking how each stage scales.
+
+A play of scale 1 is about as big as "A Doll's House" (three acts of about
+430 lines each); scale 10 has ten times as many lines in each act, and so
+on. The cast grows with the square root of the scale. Lines are nonsense
+sentences built from a small lexicon, so they tag sensibly.
+
+>>> write_play('big_play.htm', scale=100)
+>>> play = Play('big_play.htm', 'character', 'stage-direction')
+
+or from the command line:
+python3 synthetic_play.py big_play.htm --scale=100
+"""
+
+import argparse
+import math
+import random
+
+LINES_PER_ACT = 430
+NUM_ACTS = 3
+BASE_CAST = 12
+
+DETERMINERS = ['the', 'a', 'this', 'that', 'every', 'my', 'your', 'his']
+ADJECTIVES = ['black', 'white', 'cold', 'dark', 'merry', 'poor', 'dear',
+              'noble', 'strange', 'quiet', 'little', 'old']
+NOUNS = ['cat', 'night', 'lord', 'letter', 'house', 'door', 'money', 'wife',
+         'husband', 'tree', 'king', 'ghost', 'sword', 'grave', 'heart']
+VERBS = ['saw', 'took', 'heard', 'wrote', 'loved', 'opened', 'found', 'kept',
+         'knew', 'left']
+ADVERBS = ['very', 'quite', 'so', 'too', 'rather']
+DIRECTIONS = ['Enter {}.', 'Exit {}.', '{} goes to the door.',
+              '{} sits down by the stove.', '{} laughs.', 'To {}.',
+              '{} takes the letter from the table.']
+NAMES = ['Nora', 'Helmer', 'Rank', 'Linde', 'Krogstad', 'Anne', 'Hamlet',
+         'Horatio', 'Ophelia', 'Polonius', 'Laertes', 'Gertrude', 'Claudius',
+         'Marcellus', 'Barnardo', 'Osric', 'Yorick', 'Fortinbras']
+
+
+def cast(scale):
+    """
+    :return: the names of the characters of a play of the given scale
+    """
+    size = max(2, round(BASE_CAST * math.sqrt(scale)))
+    names = []
+    for i in range(size):
+        name = NAMES[i % len(NAMES)]
+        if i >= len(NAMES):
+            name += ' ' + str(i // len(NAMES) + 1)
+        names.append(name)
+    return names
+
+
+def _sentence(rng):
+    words = [rng.choice(DETERMINERS)]
+    if rng.random() < 0.3:
+        words.append(rng.choice(ADVERBS))
+    if rng.random() < 0.7:
+        words.append(rng.choice(ADJECTIVES))
+    words += [rng.choice(NOUNS), rng.choice(VERBS), rng.choice(DETERMINERS),
+              rng.choice(NOUNS)]
+    sentence = ' '.join(words)
+    return sentence[0].upper() + sentence[1:] + rng.choice('..!?')
+
+
+def _line(rng, names, chartag, stagetag):
+    if rng.random() < 0.1:
+        # Just a stage direction
+        direction = rng.choice(DIRECTIONS).format(rng.choice(names).upper())
+        return '<p>\n  <span class="{}">[{}]</span>\n</p>\n'.format(
+            stagetag, direction)
+    speaker = rng.choice(names)
+    text = ' '.join(_sentence(rng) for i in range(rng.randint(1, 4)))
+    if rng.random() < 0.25:
+        direction = rng.choice(DIRECTIONS).format(speaker)
+        text = '<span class="{}">[{}]</span> {}'.format(stagetag, direction,
+                                                        text)
+    return '<p>\n  <span class="{}">{}</span>. {}\n</p>\n'.format(
+        chartag, speaker, text)
+
+
+def write_play(filename, scale=1, seed=0, chartag='character',
+               stagetag='stage-direction'):
+    """
+    Write a synthetic play to filename, a few lines at a time so that even
+    very big plays are never held in memory.
+
+    :param scale: how many times bigger than a play of LINES_PER_ACT lines
+     per act to make it
+    :param seed: the same seed always gives the same play
+    :param chartag: the class of the spans naming speakers
+    :param stagetag: the class of the spans of stage directions
+    """
+    rng = random.Random(seed)
+    names = cast(scale)
+    with open(filename, 'w') as f:
+        f.write('<html>\n<head><title>A Synthetic Play</title></head>\n'
+                '<body>\n<h1>A SYNTHETIC PLAY</h1>\n<p>\n')
+        for act in range(1, NUM_ACTS + 1):
+            f.write('  <a href="#act{0}">ACT {0}.</a><br />\n'.format(act))
+        f.write('</p>\n<h2>DRAMATIS PERSONAE</h2>\n<p>\n')
+        for name in names:
+            f.write('  <span class="{}">{}</span>. <br />\n'.format(chartag,
+                                                                  name))
+        f.write('</p>\n')
+        for act in range(1, NUM_ACTS + 1):
+            f.write('<p>\n  <br /> <a name="act{0}" id="act{0}"></a>\n</p>\n'
+                    '<h3>ACT {0}</h3>\n'.format(act))
+            for i in range(round(LINES_PER_ACT * scale)):
+                f.write(_line(rng, names, chartag, stagetag))
+        f.write('</body>\n</html>\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('filename', help='file to write the play to')
+    parser.add_argument('--scale', default=1, type=float,
+                        help='size relative to "A Doll\'s House"')
+    parser.add_argument('--seed', default=0, type=int)
+    parser.add_argument('--chartag', default='character')
+    parser.add_argument('--stagetag', default='stage-direction')
+    args = parser.parse_args()
+    write_play(args.filename, args.scale, args.seed, args.chartag,
+               args.stagetag)
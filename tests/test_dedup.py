@@ -0,0 +1,73 @@
+import unittest
+
+from generator.dedup import BloomFilter, DuplicateFilter
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_add(self):
+        bloom = BloomFilter(capacity=100)
+        self.assertTrue(bloom.add(b'The cat sat.'))
+        self.assertFalse(bloom.add(b'The cat sat.'))
+        self.assertIn(b'The cat sat.', bloom)
+        self.assertNotIn(b'The dog sat.', bloom)
+        self.assertEqual(bloom.count, 1)
+
+    def test_error_rate(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(b'in %d' % i)
+        false_positives = sum(b'out %d' % i in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_capacity_at_least_one(self):
+        for capacity in (0, -1):
+            with self.assertRaises(ValueError):
+                BloomFilter(capacity=capacity)
+
+
+class TestDuplicateFilter(unittest.TestCase):
+
+    def test_draws_again(self):
+        dedup = DuplicateFilter(capacity=100)
+        draws = iter(['The cat sat.', 'The cat sat.', 'The dog sat.'])
+        self.assertEqual(dedup.draw_unique(lambda: next(draws)),
+                         'The cat sat.')
+        self.assertEqual(dedup.draw_unique(lambda: next(draws)),
+                         'The dog sat.')
+        self.assertEqual((dedup.sentences, dedup.draws, dedup.duplicates),
+                         (2, 3, 1))
+        self.assertAlmostEqual(dedup.duplicate_rate, 1 / 3)
+        self.assertAlmostEqual(dedup.resample_cost, 0.5)
+
+    def test_keeps_duplicate_after_max_resamples(self):
+        dedup = DuplicateFilter(capacity=100, max_resamples=2)
+        dedup.add('The cat sat.')
+        self.assertEqual(dedup.draw_unique(lambda: 'The cat sat.'),
+                         'The cat sat.')
+        self.assertEqual((dedup.draws, dedup.kept_duplicates), (3, 1))
+
+    def test_forgets_old_sentences(self):
+        dedup = DuplicateFilter(capacity=50)
+        for i in range(100):
+            self.assertTrue(dedup.add('Sentence %d.' % i))
+        # Still in the previous filter
+        self.assertFalse(dedup.add('Sentence 99.'))
+        # Forgotten when the first filter was dropped
+        self.assertTrue(all(dedup.add('Sentence %d.' % i)
+                            for i in range(10)))
+
+    def test_invalid_options(self):
+        with self.assertRaises(ValueError):
+            DuplicateFilter(capacity=-5)
+        with self.assertRaises(ValueError):
+            DuplicateFilter(max_resamples=-1)
+
+    def test_empty(self):
+        dedup = DuplicateFilter()
+        self.assertEqual((dedup.duplicate_rate, dedup.resample_cost),
+                         (0.0, 0.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+
+from generator.files import replace_file
+
+
+class TestReplaceFile(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.dir.name, 'out.bin')
+        with open(self.filename, 'wb') as f:
+            f.write(b'old')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_replaces_file(self):
+        with replace_file(self.filename) as f:
+            f.write(b'new')
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), b'new')
+        self.assertEqual(os.listdir(self.dir.name), ['out.bin'])
+
+    def test_keeps_old_file_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with replace_file(self.filename) as f:
+                f.write(b'new')
+                raise RuntimeError
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), b'old')
+        self.assertEqual(os.listdir(self.dir.name), ['out.bin'])
+
+    def test_open_file_keeps_old_contents(self):
+        with open(self.filename, 'rb') as old:
+            with replace_file(self.filename) as f:
+                f.write(b'new')
+            self.assertEqual(old.read(), b'old')
+
+
+if __name__ == '__main__':
+    unittest.main()
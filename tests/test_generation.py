@@ -0,0 +1,134 @@
+import json
+import os
+import tempfile
+import unittest
+
+from generator.dedup import DuplicateFilter
+from generator.generation import PlayGenerator, Speech, TimedPlay, \
+    format_jsonl, format_text
+from generator.grammar import State
+from generator.model_file import save_model
+from generator.vocabulary import Vocabulary
+
+STATES = {'<START>': State('<START>', '<NULL>', ['D']),
+          'D': State('D', 'DT', ['A', 'N']),
+          'A': State('A', 'JJ', ['N']),
+          'N': State('N', 'NN', ['V']),
+          'V': State('V', 'VBD', ['<END>']),
+          '<END>': State('<END>', '<NULL>', [])}
+
+ACTS = [('ACT I.', ['Cat', None, 'Cat', 'Dog', 'Cat']),
+        ('ACT II.', ['Dog', 'Cat', None])]
+
+
+class TestPlayGenerator(unittest.TestCase):
+
+    def setUp(self):
+        cat = Vocabulary()
+        cat.train(['The black cat slept. A white cat sat.', 'The cat ran.'])
+        dog = Vocabulary()
+        dog.train(['The old dog barked. A dog sat.'])
+        self.vocabularies = {'Cat': cat, 'Dog': dog, None: cat}
+
+    def generator(self, **options):
+        return PlayGenerator(ACTS, self.vocabularies, STATES, seed=1,
+                             chunk_size=2, **options)
+
+    def test_chunks(self):
+        self.assertEqual(list(self.generator().chunks()),
+                         [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1)])
+
+    def test_speeches(self):
+        speeches = list(self.generator().speeches())
+        self.assertEqual([(speech.act, speech.speaker) for speech in speeches],
+                         [(act_index, speaker)
+                          for act_index, (name, speakers) in enumerate(ACTS)
+                          for speaker in speakers])
+        self.assertEqual(len(speeches[1].sentences), 1)
+        self.assertEqual(speeches, list(self.generator().speeches()))
+
+    def test_chunks_are_independent(self):
+        generator = self.generator()
+        last = generator.generate_chunk(1, 1)
+        self.assertEqual(list(generator.speeches())[-1:], last)
+
+    def test_parallel_same_as_serial(self):
+        handle, filename = tempfile.mkstemp(suffix='.model')
+        os.close(handle)
+        try:
+            save_model(filename, self.vocabularies, STATES)
+            generator = self.generator()
+            self.assertEqual(list(generator.speeches_parallel(filename, 2)),
+                             list(generator.speeches()))
+        finally:
+            os.remove(filename)
+
+    def test_generate_within_budget(self):
+        # Each speech takes one tick of the clock
+        ticks = iter(range(100))
+        timed = self.generator().generate_within(
+            4.5, clock=lambda: next(ticks))
+
+        self.assertFalse(timed.complete)
+        self.assertEqual(timed.speeches,
+                         list(self.generator().speeches())[:5])
+        self.assertEqual(timed.acts, ACTS[:1])
+        self.assertEqual(timed.elapsed, 5)
+        self.assertEqual(timed.latencies, [1] * 5)
+
+    def test_generate_within_finishes(self):
+        timed = self.generator().generate_within(60)
+        self.assertTrue(timed.complete)
+        self.assertEqual(timed.speeches, list(self.generator().speeches()))
+        self.assertEqual(timed.acts, ACTS)
+        self.assertEqual(len(timed.latencies), len(timed.speeches))
+
+    def test_generate_within_no_time(self):
+        timed = self.generator().generate_within(0)
+        self.assertEqual((timed.speeches, timed.acts), ([], []))
+        self.assertEqual(''.join(format_text(timed.speeches, timed.acts)),
+                         '')
+        self.assertIsNone(timed.percentile(50))
+
+    def test_percentile(self):
+        timed = TimedPlay([], [], True, 1.0,
+                          [0.5, 0.1, 0.2, 0.4, 0.3, 0.6, 0.7, 0.8, 0.9, 1.0])
+        self.assertEqual(timed.percentile(50), 0.5)
+        self.assertEqual(timed.percentile(99), 1.0)
+        self.assertEqual(timed.percentile(0), 0.1)
+
+    def test_dedup(self):
+        dedup = DuplicateFilter(capacity=1000, max_resamples=10)
+        speeches = list(self.generator(dedup=dedup).speeches())
+        sentences = [sentence for speech in speeches
+                     for sentence in speech.sentences]
+
+        self.assertEqual(dedup.sentences, len(sentences))
+        self.assertEqual(len(set(sentences)),
+                         len(sentences) - dedup.kept_duplicates)
+        with self.assertRaises(ValueError):
+            next(self.generator(dedup=dedup).speeches_parallel('play.model'))
+
+    def test_format_text(self):
+        speeches = [Speech(0, 'Cat', ['The cat sat.', 'A cat ran.']),
+                    Speech(0, None, ['The dog barked.'])]
+        self.assertEqual(''.join(format_text(speeches, ACTS)),
+                         'ACT I.\n\nCAT:\nThe cat sat. A cat ran.\n\n'
+                         '[The dog barked.]\n\nACT II.\n\n')
+
+    def test_format_jsonl(self):
+        speeches = [Speech(0, 'Cat', ['The cat sat.', 'A cat ran.']),
+                    Speech(1, None, ['The dog barked.'])]
+        records = [json.loads(line)
+                   for line in format_jsonl(speeches, ACTS, seed='1', play=2)]
+        self.assertEqual(records, [
+            {'play': 2, 'seed': '1', 'act': 0, 'act_name': 'ACT I.',
+             'speaker': 'Cat', 'stage_direction': False,
+             'sentences': ['The cat sat.', 'A cat ran.']},
+            {'play': 2, 'seed': '1', 'act': 1, 'act_name': 'ACT II.',
+             'speaker': None, 'stage_direction': True,
+             'sentences': ['The dog barked.']}])
+
+
+if __name__ == '__main__':
+    unittest.main()
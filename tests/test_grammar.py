@@ -5,7 +5,10 @@ Created on Sun Dec 16 20:51:52 2018
 
 """
 
-from generator.grammar import Grammar
+from generator.grammar import Grammar, State, TemplatePool
+import os
+import random
+import tempfile
 import unittest
 
 
@@ -53,6 +56,63 @@ class TestGrammar(unittest.TestCase):
         self.assertEqual(states['A3'].output, 'JJ')
         self.assertEqual(states['Deg2'].output, 'RB')
 
+
+class TestTemplatePool(unittest.TestCase):
+
+    def setUp(self):
+        self.grammar = Grammar()
+        self.states = {'<START>': State('<START>', '<NULL>', ['D']),
+                       'D': State('D', 'DT', ['N']),
+                       'N': State('N', 'NN', ['CC', '<END>']),
+                       'CC': State('CC', 'CC', ['<START>']),
+                       '<END>': State('<END>', '<NULL>', [])}
+        handle, self.filename = tempfile.mkstemp()
+        os.close(handle)
+        os.remove(self.filename)
+
+    def tearDown(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def test_same_templates_as_make_template_simple(self):
+        pool = self.grammar.make_template_pool(self.states, 50, random.Random(1))
+        rng = random.Random(1)
+        templates = [self.grammar.make_template_simple(self.states, rng) for i in range(50)]
+        self.assertEqual(len(pool), 50)
+        self.assertEqual([pool[i] for i in range(50)], templates)
+        self.assertEqual(set(pool.tags), {'DT', 'NN', 'CC'})
+
+    def test_draw(self):
+        pool = TemplatePool([['DT', 'NN'], ['DT', 'NN', 'CC', 'DT', 'NN']])
+        drawn = [pool.draw(random.Random(seed)) for seed in range(20)]
+        self.assertIn(['DT', 'NN'], drawn)
+        self.assertIn(['DT', 'NN', 'CC', 'DT', 'NN'], drawn)
+
+    def test_save_and_load(self):
+        pool = self.grammar.make_template_pool(self.states, 50, random.Random(1))
+        pool.save(self.filename)
+        loaded = TemplatePool.load(self.filename)
+        self.assertEqual([loaded[i] for i in range(len(loaded))],
+                         [pool[i] for i in range(len(pool))])
+
+    def test_load_other_byte_order(self):
+        pool = self.grammar.make_template_pool(self.states, 50, random.Random(1))
+        pool.save(self.filename)
+        with open(self.filename, 'r+b') as f:
+            f.seek(8)
+            mark = f.read(4)
+            f.seek(8)
+            f.write(mark[::-1])
+        self.assertIsNone(TemplatePool.load(self.filename))
+
+    def test_load_template_pool_is_cached(self):
+        pool = self.grammar.load_template_pool(self.states, self.filename, 50, seed=1)
+        loaded = self.grammar.load_template_pool(self.states, self.filename, 50, seed=1)
+        self.assertEqual(loaded.key, pool.key)
+        self.assertEqual([loaded[i] for i in range(50)], [pool[i] for i in range(50)])
+        # A pool of another size is generated again
+        self.assertEqual(len(self.grammar.load_template_pool(self.states, self.filename, 20, seed=1)), 20)
+
 if __name__ == '__main__':        
     
     unittest.main()
@@ -0,0 +1,119 @@
+import os
+import tempfile
+import unittest
+
+from generator.incremental import TrainingState
+from generator.parse_play import PlayData
+from generator.vocabulary import Vocabulary
+
+LINES = [
+    ('act1', None, None, ['Enter NORA.']),
+    ('act1', 'Nora', 'Is that you? The cat is black.', []),
+    ('act1', 'Helmer', 'Yes, it is. The night is cold.', ['Laughing.']),
+    ('act1', 'Nora', 'The white cat saw the black cat.', []),
+    ('act2', 'Helmer', 'Not tonight.', []),
+    ('act2', None, None, ['Exit HELMER.']),
+]
+NAMES = ['Nora', 'Helmer', 'Rank', None]
+
+
+def play_data(lines):
+    data = PlayData()
+    for line in lines:
+        data.append(*line)
+    return data
+
+
+def edited(index, text):
+    lines = list(LINES)
+    act, speaker, line, stage_direction = lines[index]
+    lines[index] = (act, speaker, text, stage_direction)
+    return lines
+
+
+class TestTrainingState(unittest.TestCase):
+
+    def assertTrainedOn(self, vocab, utterances, **options):
+        expected = Vocabulary(**options)
+        expected.train(utterances)
+        self.assertEqual(vocab.freqs_by_features, expected.freqs_by_features)
+        if vocab.base is None:
+            self.assertDictEqual(vocab.freqs_by_tag, expected.freqs_by_tag)
+        self.assertDictEqual(dict(vocab.sentence_counts),
+                             dict(expected.sentence_counts))
+
+    def test_first_run_trains_everything(self):
+        state = TrainingState()
+        vocabs = state.train(play_data(LINES), NAMES)
+
+        self.assertSetEqual(set(vocabs), set(NAMES))
+        self.assertSetEqual(set(state.retrained), set(NAMES))
+        self.assertTrainedOn(vocabs['Nora'],
+                             ['Is that you? The cat is black.',
+                              'The white cat saw the black cat.'])
+        self.assertTrainedOn(vocabs[None], ['Enter NORA.', 'Exit HELMER.'])
+
+    def test_updates_only_changed_speakers(self):
+        state = TrainingState()
+        vocabs = state.train(play_data(LINES), NAMES)
+        helmer = vocabs['Helmer']
+        vocabs = state.train(play_data(edited(3, 'The dog ran.')), NAMES)
+
+        self.assertListEqual(state.updated, ['Nora'])
+        self.assertListEqual(state.retrained, [])
+        self.assertIs(vocabs['Helmer'], helmer)
+        self.assertTrainedOn(vocabs['Nora'],
+                             ['Is that you? The cat is black.',
+                              'The dog ran.'])
+
+    def test_shared_base(self):
+        base = Vocabulary(word_order=0)
+        state = TrainingState(base=base)
+        state.train(play_data(LINES), NAMES)
+        vocabs = state.train(play_data(edited(4, 'Very cold.')), NAMES)
+
+        self.assertListEqual(state.updated, ['Helmer'])
+        self.assertIs(vocabs['Helmer'].base, base)
+        self.assertTrainedOn(base, [text for speaker, text in play_data(
+            edited(4, 'Very cold.')).utterances()], word_order=0)
+        self.assertTrainedOn(vocabs['Helmer'],
+                             ['Yes, it is. The night is cold.', 'Very cold.'],
+                             base=base)
+
+    def test_pruned_vocabularies_are_retrained(self):
+        state = TrainingState(top_k=1)
+        state.train(play_data(LINES), NAMES)
+        vocabs = state.train(play_data(edited(3, 'The dog ran.')), NAMES)
+
+        self.assertListEqual(state.retrained, ['Nora'])
+        self.assertTrainedOn(vocabs['Nora'],
+                             ['Is that you? The cat is black.',
+                              'The dog ran.'], top_k=1)
+
+    def test_save_and_load(self):
+        handle, filename = tempfile.mkstemp()
+        os.close(handle)
+        os.remove(filename)
+        try:
+            state = TrainingState(filename)
+            state.train(play_data(LINES), NAMES)
+            state.save()
+
+            loaded = TrainingState(filename)
+            vocabs = loaded.train(play_data(edited(3, 'The dog ran.')),
+                                  NAMES)
+            self.assertListEqual(loaded.updated, ['Nora'])
+            self.assertTrainedOn(vocabs['Helmer'],
+                                 ['Yes, it is. The night is cold.',
+                                  'Not tonight.'])
+
+            # Saved with other options, so trained from scratch
+            other = TrainingState(filename, word_order=2)
+            other.train(play_data(LINES), NAMES)
+            self.assertSetEqual(set(other.retrained), set(NAMES))
+        finally:
+            os.remove(filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
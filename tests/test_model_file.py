@@ -0,0 +1,121 @@
+import os
+import random
+import tempfile
+import unittest
+
+from generator.grammar import Grammar
+from generator.model_file import MappedModel, save_model
+from generator.vocabulary import Vocabulary
+
+
+class TestModelFile(unittest.TestCase):
+
+    def setUp(self):
+        self.vocab = Vocabulary()
+        self.vocab.train(["""The black cat saw a white cat in the black night.
+                          The black night was darker than usual.""",
+                          'The cat was black.'])
+        self.states = Grammar().load_machine('states_test.txt')
+        handle, self.filename = tempfile.mkstemp(suffix='.model')
+        os.close(handle)
+        save_model(self.filename, {'Cat': self.vocab, None: self.vocab},
+                   self.states)
+        self.model = MappedModel(self.filename)
+
+    def tearDown(self):
+        del self.model
+        os.remove(self.filename)
+
+    def test_names(self):
+        self.assertSetEqual(set(self.model.names()), {'Cat', None})
+
+    def test_unknown_name(self):
+        with self.assertRaises(KeyError):
+            self.model.vocabulary('Dog')
+
+    def test_states(self):
+        states = self.model.states()
+        self.assertSetEqual(set(states), set(self.states))
+        self.assertEqual(states['V3'].output, 'VB')
+        self.assertListEqual(states['NP2'].transitions, ['A2', 'NNP2'])
+
+    def test_same_words_as_vocabulary(self):
+        mapped = self.model.vocabulary('Cat')
+        for seed in range(20):
+            for context in [('black', 'JJ', 'NN', 'VBD'),
+                            ('<s>', '<s>', 'DT', 'JJ'),
+                            ('night', 'NN', 'RB', 'RB')]:
+                self.assertEqual(
+                    mapped.random_word(*context, rng=random.Random(seed)),
+                    self.vocab.random_word(*context, rng=random.Random(seed)))
+
+    def test_same_sentence_counts_as_vocabulary(self):
+        mapped = self.model.vocabulary('Cat')
+        for seed in range(20):
+            self.assertEqual(
+                mapped.random_sentence_count(random.Random(seed)),
+                self.vocab.random_sentence_count(random.Random(seed)))
+
+    def test_shared_base(self):
+        base = Vocabulary(word_order=0)
+        base.train(['The white dog was very cold.', 'The cat was black.'])
+        vocab = Vocabulary(base=base)
+        vocab.train(['The black cat saw a white cat.'])
+        save_model(self.filename, {'Cat': vocab})
+        mapped = MappedModel(self.filename).vocabulary('Cat')
+
+        self.assertEqual(mapped.base.word_order, 0)
+        for seed in range(20):
+            for context in [('black', 'JJ', 'NN', 'VBD'),
+                            ('very', 'RB', 'JJ', '</s>'),
+                            ('was', 'VBD', 'QQ', 'QQ')]:
+                self.assertEqual(
+                    mapped.random_word(*context, rng=random.Random(seed)),
+                    vocab.random_word(*context, rng=random.Random(seed)))
+
+    def test_save_over_mapped_model(self):
+        mapped = self.model.vocabulary('Cat')
+        other = Vocabulary()
+        other.train(['A dog barked.'])
+        save_model(self.filename, {'Dog': other})
+
+        # The model mapped before still reads the old file
+        for seed in range(5):
+            self.assertEqual(
+                mapped.random_word('black', 'JJ', 'NN', 'VBD',
+                                   random.Random(seed)),
+                self.vocab.random_word('black', 'JJ', 'NN', 'VBD',
+                                       random.Random(seed)))
+        self.assertSetEqual(set(MappedModel(self.filename).names()), {'Dog'})
+
+    def test_save_mapped_vocabulary(self):
+        with self.assertRaises(ValueError):
+            save_model(self.filename + '.other',
+                       {'Cat': self.model.vocabulary('Cat')})
+        self.assertFalse(os.path.exists(self.filename + '.other.tmp'))
+
+    def test_pruned(self):
+        vocab = Vocabulary(min_counts=[0, 0, 0, 2], top_k=2)
+        vocab.train(['The black cat saw a white cat. The black cat saw '
+                     'the black dog.', 'A white cat was cold.'])
+        save_model(self.filename, {'Cat': vocab})
+        mapped = MappedModel(self.filename).vocabulary('Cat')
+
+        for seed in range(20):
+            for context in [('black', 'JJ', 'NN', 'VBD'),
+                            ('saw', 'VBD', 'DT', 'JJ'),
+                            ('a', 'DT', 'JJ', 'NN')]:
+                self.assertEqual(
+                    mapped.random_word(*context, rng=random.Random(seed)),
+                    vocab.random_word(*context, rng=random.Random(seed)))
+
+    def test_build_sentence(self):
+        mapped = self.model.vocabulary(None)
+        tags = ['<s>', 'DT', 'JJ', 'NN', 'VBD', 'JJR', 'IN', 'JJ', '</s>']
+        self.assertEqual(mapped.build_sentence(list(tags), random.Random(1)),
+                         self.vocab.build_sentence(list(tags),
+                                                   random.Random(1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
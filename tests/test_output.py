@@ -0,0 +1,90 @@
+import gzip
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from generator.output import ShardedWriter, open_shard
+
+
+class TestShardedWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_shards(self):
+        with ShardedWriter(self.path('out-{}.txt'), shard_size=3,
+                           batch_size=2) as writer:
+            for i in range(7):
+                writer.write('%d\n' % i)
+
+        self.assertEqual(writer.records, 7)
+        self.assertEqual(writer.filenames, [self.path('out-%d.txt' % i)
+                                            for i in range(3)])
+        contents = []
+        for filename in writer.filenames:
+            with open(filename) as f:
+                contents.append(f.read())
+        self.assertEqual(contents, ['0\n1\n2\n', '3\n4\n5\n', '6\n'])
+
+    def test_gzip(self):
+        with ShardedWriter(self.path('out-{}.jsonl.gz')) as writer:
+            writer.write('{"speaker": "Nora"}\n')
+
+        with gzip.open(self.path('out-0.jsonl.gz'), 'rt') as f:
+            self.assertEqual(f.read(), '{"speaker": "Nora"}\n')
+
+    def test_nothing_written(self):
+        writer = ShardedWriter(self.path('out-{}.txt'))
+        writer.close()
+        self.assertEqual(writer.filenames, [])
+
+    def test_pattern_without_index(self):
+        for pattern in ['out.txt', 'out-{name}.txt', 'out-{1}.txt']:
+            with self.assertRaises(ValueError):
+                ShardedWriter(self.path(pattern))
+
+    def test_sizes_at_least_one(self):
+        with self.assertRaises(ValueError):
+            ShardedWriter(self.path('out-{}.txt'), shard_size=0)
+        with self.assertRaises(ValueError):
+            ShardedWriter(self.path('out-{}.txt'), batch_size=0)
+
+    def test_error_raised_on_close(self):
+        writer = ShardedWriter(self.path('missing/out-{}.txt'))
+        writer.write('text\n')
+        with self.assertRaises(FileNotFoundError):
+            writer.close()
+
+    def test_error_before_close_stops_thread(self):
+        writer = ShardedWriter(self.path('missing/out-{}.txt'),
+                               batch_size=2)
+        writer.write('text\n')
+        writer.write('text\n')
+        # Wait for the first batch to fail, so the error is raised by close
+        # while it still has a batch to put
+        while writer._error is None:
+            time.sleep(0.01)
+        writer.write('more text\n')
+        thread = writer._thread
+        with self.assertRaises(FileNotFoundError):
+            writer.close()
+        self.assertFalse(thread.is_alive())
+        writer.close()
+
+    def test_open_shard_plain(self):
+        with open_shard(self.path('plain.txt')) as f:
+            f.write('text')
+        with open(self.path('plain.txt')) as f:
+            self.assertEqual(f.read(), 'text')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from generator.parse_play import Line, Play
+from generator.parse_play import Line, Play, PlayData
 from bs4 import BeautifulSoup
 import os
 import unittest
@@ -158,6 +158,52 @@ class TestPlay(unittest.TestCase):
         self.assertTrue(set(['Ophelia', 'Cornelius', 'Clowns', 'Hamlet', 'Sailors', 'Polonius', 'Attendants']).issubset(set(ham_chars)))
         self.assertTrue(set(['Nora', 'Rank', 'Servant', 'Anne', 'Krogstad']).issubset(set(doll_chars)))
 
+class TestPlayData(unittest.TestCase):
+
+    def setUp(self):
+        self.data = PlayData()
+        self.data.append('act1', 'Nora', 'Is that you, Torvald?', ['Laughing.'])
+        self.data.append('act1', 'Helmer', 'Yes, it is.', [])
+        self.data.append('act1', None, None, ['Enter MAID.', 'Exit.'])
+        self.data.append('act2', 'Nora', 'Not tonight.', [])
+
+    def test_rows(self):
+        self.assertEqual(len(self.data), 4)
+        self.assertEqual(self.data[0].act, 'act1')
+        self.assertEqual(self.data[0].speaker, 'Nora')
+        self.assertEqual(self.data[0].line, 'Is that you, Torvald?')
+        self.assertEqual(self.data[0].stage_direction, ['Laughing.'])
+        self.assertEqual(self.data[-1].line, 'Not tonight.')
+        self.assertIsNone(self.data[2].line)
+        self.assertEqual(self.data[2].stage_direction, ['Enter MAID.', 'Exit.'])
+        with self.assertRaises(IndexError):
+            self.data[4]
+
+    def test_speakers_in_act(self):
+        self.assertEqual(self.data.speakers_in_act('act1'), ['Nora', 'Helmer', None])
+        self.assertEqual(self.data.speakers_in_act('act2'), ['Nora'])
+        self.assertEqual(self.data.speakers_in_act('act3'), [])
+
+    def test_lines_by_speaker(self):
+        self.assertEqual(self.data.lines_by_speaker('Nora'),
+                         ['Is that you, Torvald?', 'Not tonight.'])
+        self.assertEqual(self.data.lines_by_speaker('Rank'), [])
+        self.data.append('act2', 'Rank', 'Good evening.', [])
+        self.assertEqual(self.data.lines_by_speaker('Rank'), ['Good evening.'])
+
+    def test_stage_directions_by_speaker(self):
+        self.assertEqual(self.data.stage_directions_by_speaker(None),
+                         ['Enter MAID.', 'Exit.'])
+        self.assertEqual(self.data.stage_directions_by_speaker('Nora'),
+                         ['Laughing.'])
+
+    def test_from_lines(self):
+        data = PlayData.from_lines(self.data)
+        self.assertEqual([(line.act, line.speaker, line.line, line.stage_direction)
+                          for line in data],
+                         [(line.act, line.speaker, line.line, line.stage_direction)
+                          for line in self.data])
+
 if __name__ == '__main__':
 
     unittest.main()
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from generator.dialogue import PlaySkeleton
+from generator.parse_play import Play
+from generator.pipeline import train_play
+from generator.token_cache import TokenCache
+from generator.vocabulary import Vocabulary
+
+PLAY = """
+<html><body>
+<p><a href="#act1">ACT I.</a> <a href="#act2">ACT II.</a></p>
+<p><span class="character">Nora</span>. <span class="character">Helmer</span>.
+<span class="character">Rank</span>.</p>
+<p><a name="act1" id="act1"></a></p>
+<p><span class="stage-direction">[Enter NORA, humming a tune.]</span></p>
+<p><span class="character">Nora</span>. Is that you, Torvald? The cat is black.</p>
+<p><span class="character">Helmer</span>. Yes, it is. The night is cold.</p>
+<p><span class="character">Nora</span>. The white cat saw the black cat.</p>
+<p><a name="act2" id="act2"></a></p>
+<p><span class="character">Helmer</span>. <span class="stage-direction">[Laughing.]</span> Not tonight.</p>
+<p><span class="stage-direction">[Exit HELMER.]</span></p>
+</body></html>
+"""
+
+
+class TestTrainPlay(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp(suffix='.htm')
+        with os.fdopen(handle, 'w') as f:
+            f.write(PLAY)
+        self.executor = ThreadPoolExecutor(2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        os.remove(self.filename)
+
+    def train(self, **options):
+        return train_play(self.filename, 'character', 'stage-direction',
+                          executor=self.executor, batch_size=1,
+                          max_pending=1, **options)
+
+    def test_same_as_training_each_character(self):
+        play, vocabs = self.train()
+        skeleton = PlaySkeleton(Play(self.filename, 'character',
+                                     'stage-direction'))
+
+        self.assertSetEqual(set(vocabs), set(skeleton.chars))
+        for char, lines in skeleton.chars.items():
+            vocab = Vocabulary()
+            vocab.train(lines)
+            self.assertDictEqual(vocabs[char].freqs_by_features,
+                                 vocab.freqs_by_features)
+            self.assertDictEqual(dict(vocabs[char].sentence_counts),
+                                 dict(vocab.sentence_counts))
+        self.assertEqual(len(play.lines), 6)
+
+    def test_shared_base(self):
+        base = Vocabulary(word_order=0)
+        play, vocabs = self.train(base=base)
+
+        self.assertIs(vocabs['Nora'].base, base)
+        self.assertIsNone(vocabs['Nora'].root.children['NN'].counts)
+        self.assertIn('night', base.freqs_by_tag['NN'])
+
+    def test_fills_token_cache(self):
+        cache = TokenCache()
+        self.train(token_cache=cache)
+        self.assertEqual(cache.misses, 6)
+        self.train(token_cache=cache)
+        self.assertEqual(cache.hits, 6)
+
+    def test_parse_error(self):
+        with self.assertRaises(FileNotFoundError):
+            train_play(self.filename + '.missing', 'character',
+                       'stage-direction', executor=self.executor)
+
+    def test_tagging_error_stops_parsing(self):
+        class FailingExecutor:
+            def submit(self, *args):
+                raise RuntimeError('tagging failed')
+
+        threads = threading.active_count()
+        with self.assertRaises(RuntimeError):
+            train_play(self.filename, 'character', 'stage-direction',
+                       executor=FailingExecutor(), batch_size=1,
+                       max_lines=1)
+        self.assertEqual(threading.active_count(), threads)
+
+
+if __name__ == '__main__':
+    unittest.main()
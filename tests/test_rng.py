@@ -0,0 +1,42 @@
+import unittest
+
+from generator.rng import make_rng
+
+
+class TestMakeRng(unittest.TestCase):
+
+    def test_same_seed_and_stream_repeats(self):
+        first = make_rng(42, 'act', 3)
+        second = make_rng(42, 'act', 3)
+        self.assertListEqual([first.random() for i in range(5)],
+                             [second.random() for i in range(5)])
+
+    def test_different_streams_differ(self):
+        act3 = make_rng(42, 'act', 3)
+        act4 = make_rng(42, 'act', 4)
+        self.assertNotEqual([act3.random() for i in range(5)],
+                            [act4.random() for i in range(5)])
+
+    def test_different_seeds_differ(self):
+        self.assertNotEqual(make_rng(1, 'skeleton').random(),
+                            make_rng(2, 'skeleton').random())
+
+    def test_seed_as_string_or_int(self):
+        self.assertEqual(make_rng('7', 'act', 0).random(),
+                         make_rng(7, 'act', 0).random())
+
+    def test_parts_are_not_joined(self):
+        self.assertNotEqual(make_rng('42:1', 'act', 0).random(),
+                            make_rng(42, 1, 'act', 0).random())
+        self.assertNotEqual(make_rng('42', 'act:0').random(),
+                            make_rng('42', 'act', 0).random())
+
+    def test_seed_as_tuple(self):
+        self.assertEqual(make_rng((42, 'play', 1), 'act', 0).random(),
+                         make_rng(42, 'play', 1, 'act', 0).random())
+        self.assertNotEqual(make_rng((42, 'play', 1), 'act', 0).random(),
+                            make_rng('42:play:1', 'act', 0).random())
+
+
+if __name__ == '__main__':
+    unittest.main()
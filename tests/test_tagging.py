@@ -0,0 +1,68 @@
+import unittest
+
+import nltk
+
+from generator import tagging
+from generator.tagging import Tagger, get_tagger
+
+
+class CountingTagger(nltk.DefaultTagger):
+    loads = 0
+
+    def __init__(self):
+        super().__init__('NN')
+        CountingTagger.loads += 1
+        self.tagged = 0
+
+    def tag(self, tokens):
+        self.tagged += 1
+        return super().tag(tokens)
+
+
+class TestTagger(unittest.TestCase):
+
+    def setUp(self):
+        CountingTagger.loads = 0
+        tagging.BACKENDS['counting'] = CountingTagger
+
+    def tearDown(self):
+        del tagging.BACKENDS['counting']
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            Tagger('no such tagger')
+
+    def test_tag(self):
+        tagger = Tagger('counting')
+        self.assertListEqual(tagger.tag(['Hamlet', '!']),
+                             [('Hamlet', 'NN'), ('!', 'NN')])
+
+    def test_backend_loaded_once(self):
+        tagger = Tagger('counting')
+        self.assertEqual(CountingTagger.loads, 0)
+        tagger.tag(['My', 'lord', '.'])
+        tagger.tag(['Good', 'night', '.'])
+        self.assertEqual(CountingTagger.loads, 1)
+
+    def test_repeated_sentences_tagged_once(self):
+        tagger = Tagger('counting')
+        tagged = tagger.tag_sents([['My', 'lord', '.'], ['Hamlet', '!'],
+                                   ['My', 'lord', '.']])
+        tagger.tag(['Hamlet', '!'])
+        self.assertEqual(tagger._backend.tagged, 2)
+        self.assertEqual(tagged[0], tagged[2])
+        self.assertEqual((tagger.hits, tagger.misses), (2, 2))
+
+    def test_memo_is_bounded(self):
+        tagger = Tagger('counting', max_memo=1)
+        tagger.tag(['My', 'lord', '.'])
+        tagger.tag(['Hamlet', '!'])
+        tagger.tag(['My', 'lord', '.'])
+        self.assertEqual(tagger._backend.tagged, 3)
+
+    def test_get_tagger_is_shared(self):
+        self.assertIs(get_tagger('counting'), get_tagger('counting'))
+
+
+if __name__ == '__main__':
+    unittest.main()
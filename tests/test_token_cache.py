@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+
+from generator.token_cache import TokenCache
+from generator.vocabulary import Vocabulary
+
+TAGGED = [[('To', 'TO'), ('be', 'VB'), ('.', '.')]]
+
+
+class TestTokenCache(unittest.TestCase):
+
+    def test_get_missing(self):
+        cache = TokenCache()
+        self.assertIsNone(cache.get('To be.'))
+        self.assertEqual(cache.misses, 1)
+
+    def test_put_and_get(self):
+        cache = TokenCache()
+        cache.put('To be.', TAGGED)
+        self.assertEqual(cache.get('To be.'),
+                         ((('To', 'TO'), ('be', 'VB'), ('.', '.')),))
+        self.assertEqual(cache.hits, 1)
+
+    def test_keyed_by_tokenizer(self):
+        cache = TokenCache()
+        cache.put('To be.', TAGGED, 'perceptron', 'punkt')
+        self.assertIsNone(cache.get('To be.', 'perceptron', 'regex'))
+        self.assertIsNotNone(cache.get('To be.', 'perceptron', 'punkt'))
+
+    def test_evicts_least_recently_used(self):
+        cache = TokenCache(max_entries=2)
+        cache.put('one', TAGGED)
+        cache.put('two', TAGGED)
+        cache.get('one')
+        cache.put('three', TAGGED)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNotNone(cache.get('one'))
+        self.assertIsNone(cache.get('two'))
+        self.assertIsNotNone(cache.get('three'))
+
+    def test_save_and_load(self):
+        handle, filename = tempfile.mkstemp()
+        os.close(handle)
+        os.remove(filename)
+        try:
+            cache = TokenCache(filename)
+            cache.put('To be.', TAGGED)
+            cache.save()
+            self.assertIsNotNone(TokenCache(filename).get('To be.'))
+        finally:
+            os.remove(filename)
+
+    def test_vocabulary_uses_cache(self):
+        cache = TokenCache()
+        text = 'The black cat was very cold.'
+        first = Vocabulary(token_cache=cache)
+        first.train([text])
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+        second = Vocabulary(token_cache=cache)
+        second.train([text])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertDictEqual(second.freqs_by_features,
+                             first.freqs_by_features)
+
+
+if __name__ == '__main__':
+    unittest.main()
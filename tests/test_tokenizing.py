@@ -0,0 +1,66 @@
+import unittest
+
+from generator.tokenizing import PunktTokenizer, RegexTokenizer, get_tokenizer
+from generator.vocabulary import Vocabulary
+
+
+class TestRegexTokenizer(unittest.TestCase):
+
+    def setUp(self):
+        self.tokenizer = RegexTokenizer()
+
+    def test_single_sentence(self):
+        self.assertEqual(
+            self.tokenizer.tokenize('It was a dark and dreary morning.'),
+            [['It', 'was', 'a', 'dark', 'and', 'dreary', 'morning', '.']])
+
+    def test_multiple_sentences(self):
+        self.assertEqual(self.tokenizer.tokenize('To be. Or not\nto be?'),
+                         [['To', 'be', '.'], ['Or', 'not', 'to', 'be', '?']])
+
+    def test_contractions(self):
+        self.assertEqual(
+            self.tokenizer.tokenize("I can't, and you'll not. 'Tis Nora's."),
+            [['I', 'ca', "n't", ',', 'and', 'you', "'ll", 'not', '.'],
+             ["'T", 'is', 'Nora', "'s", '.']])
+
+    def test_curly_apostrophes(self):
+        self.assertEqual(self.tokenizer.tokenize('I’ll go; don’t stay.'),
+                         [['I', '’ll', 'go', ';', 'do', 'n’t', 'stay', '.']])
+
+    def test_dashes(self):
+        self.assertEqual(
+            self.tokenizer.tokenize('So—and yet--no... well-met.'),
+            [['So', '—', 'and', 'yet', '--', 'no', '...', 'well-met', '.']])
+
+    def test_abbreviations(self):
+        self.assertEqual(self.tokenizer.tokenize('Mrs. Linde is here. Go!'),
+                         [['Mrs.', 'Linde', 'is', 'here', '.'], ['Go', '!']])
+
+    def test_quotes(self):
+        self.assertEqual(self.tokenizer.tokenize('He said "No." Then left.'),
+                         [['He', 'said', '``', 'No', '.', "''"],
+                          ['Then', 'left', '.']])
+
+    def test_empty(self):
+        self.assertEqual(self.tokenizer.tokenize('  '), [])
+
+
+class TestGetTokenizer(unittest.TestCase):
+
+    def test_shared(self):
+        self.assertIs(get_tokenizer('regex'), get_tokenizer('regex'))
+        self.assertIsInstance(get_tokenizer(), PunktTokenizer)
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            get_tokenizer('whitespace')
+
+    def test_vocabulary_uses_tokenizer(self):
+        vocab = Vocabulary(tokenizer=get_tokenizer('regex'))
+        self.assertEqual(vocab._tokenize_by_sentence('To be. Or not to be?'),
+                         [['To', 'be', '.'], ['Or', 'not', 'to', 'be', '?']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,10 @@
+import random
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
-from generator.vocabulary import Vocabulary, START_SENTENCE
+from generator.token_cache import TokenCache
+from generator.vocabulary import Vocabulary, VocabularyRegistry, \
+    START_SENTENCE
 
 
 class TestVocabulary(unittest.TestCase):
@@ -129,6 +133,129 @@ class TestVocabulary(unittest.TestCase):
                                          'RB', 'TO', 'NNP', '</s>'])
         self.assertEqual(sentence, text)
 
+    def test_random_word_with_two_previous_words(self):
+        vocab = Vocabulary(word_order=2)
+        text = 'The cat saw the dog. A bird saw a fish.'
+        vocab.train([text])
+
+        for seed in range(10):
+            rng = random.Random(seed)
+            self.assertEqual(vocab.random_word(['cat', 'saw'], 'VBD', 'DT',
+                                               'NN', rng), 'the')
+            self.assertEqual(vocab.random_word(['bird', 'saw'], 'VBD', 'DT',
+                                               'NN', rng), 'a')
+
+    def test_random_word_backs_off_to_fewer_words(self):
+        vocab = Vocabulary(word_order=2)
+        text = 'The cat saw the dog. A bird saw a fish.'
+        vocab.train([text])
+
+        words = {vocab.random_word(['fish', 'saw'], 'VBD', 'DT', 'NN',
+                                   random.Random(seed))
+                 for seed in range(20)}
+        self.assertSetEqual(words, {'the', 'a'})
+
+    def test_negative_word_order(self):
+        with self.assertRaises(ValueError):
+            Vocabulary(word_order=-1)
+
+    def test_shared_base(self):
+        base = Vocabulary(word_order=0)
+        base.train(['The black cat saw a white cat.',
+                    'The white dog was very cold.'])
+        vocab = Vocabulary(base=base)
+        vocab.train(['The black cat saw a white cat.'])
+
+        self.assertDictEqual(vocab.freqs_by_tag, base.freqs_by_tag)
+        self.assertIsNone(vocab.root.children['NN'].counts)
+        # Seen by this vocabulary
+        self.assertEqual(vocab.random_word('black', 'JJ', 'NN', 'VBD'), 'cat')
+        # Only seen by the base
+        words = {vocab.random_word('very', 'RB', 'JJ', '</s>',
+                                   random.Random(seed))
+                 for seed in range(20)}
+        self.assertSetEqual(words, {'cold'})
+
+    def test_prune_top_k(self):
+        vocab = Vocabulary(top_k=1)
+        vocab.train(['The cat sat. The cat ran. The dog sat.'])
+
+        self.assertDictEqual(dict(vocab.freqs_by_tag['NN']), {'cat': 2})
+        for counts in vocab.freqs_by_features.values():
+            self.assertEqual(len(counts), 1)
+
+    def test_prune_backs_off_with_pruned_mass(self):
+        vocab = Vocabulary(min_counts=[0, 0, 0, 2])
+        vocab.train(['The cat saw the dog. The cat saw the dog.',
+                     'A bird saw a fish.'])
+
+        context = ('saw', 'VBD', 'DT', 'NN')
+        self.assertDictEqual(dict(vocab.freqs_by_features[context]),
+                             {'the': 2})
+        self.assertNotIn(('bird', 'NN', 'VBD', 'DT'), vocab.freqs_by_features)
+        # 'a' was pruned from the context, but can still be drawn from the
+        # context without the previous word
+        words = {vocab.random_word(*context, rng=random.Random(seed))
+                 for seed in range(30)}
+        self.assertSetEqual(words, {'the', 'a'})
+
+    def test_prune_stats(self):
+        vocab = Vocabulary(min_counts=[0, 0, 0, 2])
+        vocab.train(['The cat saw the dog. The cat saw the dog.',
+                     'A bird saw a fish.'])
+
+        self.assertListEqual([stats.level for stats in vocab.prune_stats],
+                             [0, 1, 2, 3])
+        self.assertEqual(vocab.prune_stats[0].retained_mass, 1.0)
+        word_level = vocab.prune_stats[3]
+        self.assertLess(word_level.contexts_after, word_level.contexts_before)
+        self.assertLess(word_level.retained_mass, 1.0)
+
+    def test_update(self):
+        vocab = Vocabulary()
+        vocab.train(['The black cat saw a white cat.', 'Aye.',
+                     'The white dog was very cold. It ran.'])
+        vocab.update(added=['A dog saw the cat.'],
+                     removed=['The white dog was very cold. It ran.'])
+        expected = Vocabulary()
+        expected.train(['The black cat saw a white cat.', 'Aye.',
+                        'A dog saw the cat.'])
+
+        self.assertDictEqual(vocab.freqs_by_features,
+                             expected.freqs_by_features)
+        self.assertDictEqual(vocab.freqs_by_tags, expected.freqs_by_tags)
+        self.assertDictEqual(vocab.freqs_by_tag, expected.freqs_by_tag)
+        self.assertDictEqual(dict(vocab.sentence_counts),
+                             dict(expected.sentence_counts))
+        self.assertNotIn('RB', vocab.root.children)
+
+    def test_update_after_sampling(self):
+        vocab = Vocabulary()
+        vocab.train(['The cat sat.'])
+        self.assertEqual(vocab.random_word('the', 'DT', 'NN', 'VBD'), 'cat')
+        vocab.update(added=['The dog sat.'], removed=['The cat sat.'])
+        self.assertEqual(vocab.random_word('the', 'DT', 'NN', 'VBD'), 'dog')
+
+    def test_update_pruned(self):
+        vocab = Vocabulary(top_k=1)
+        vocab.train(['The cat sat.'])
+        with self.assertRaises(RuntimeError):
+            vocab.update(added=['The dog sat.'])
+
+    def test_sentence_counts(self):
+        vocab = Vocabulary()
+        vocab.train(['To be. Or not to be?', 'Aye.', 'No. No. No!', 'Yes.',
+                     ''])
+
+        self.assertDictEqual(dict(vocab.sentence_counts), {1: 2, 2: 1, 3: 1})
+        for seed in range(10):
+            self.assertIn(vocab.random_sentence_count(random.Random(seed)),
+                          {1, 2, 3})
+
+    def test_sentence_count_untrained(self):
+        vocab = Vocabulary()
+        self.assertEqual(vocab.random_sentence_count(), 1)
+
     def test_tokenize_by_sentence_for_single_sentence(self):
         vocab = Vocabulary()
         utterance = 'It was a dark and dreary morning.'
@@ -163,5 +290,51 @@ class TestVocabulary(unittest.TestCase):
                          ['Or', 'not', 'to', 'be', '?'])
 
 
+class TestVocabularyRegistry(unittest.TestCase):
+
+    def test_trains_on_first_use(self):
+        vocabs = VocabularyRegistry({'Nora': ['The black cat was very cold.'],
+                                     'Helmer': ['No, no; not tonight.']})
+        self.assertListEqual(vocabs.trained(), [])
+
+        nora = vocabs['Nora']
+        self.assertListEqual(vocabs.trained(), ['Nora'])
+        self.assertIs(vocabs['Nora'], nora)
+        self.assertEqual(nora.random_word('black', 'JJ', 'NN', 'VBD'), 'cat')
+
+    def test_passes_options(self):
+        vocabs = VocabularyRegistry({None: ['Exit.']}, word_order=2)
+        self.assertEqual(vocabs[None].word_order, 2)
+
+    def test_trains_from_several_threads(self):
+        lines = {'Nora': ['The black cat was very cold.', 'Yes, Torvald.'],
+                 'Helmer': ['No, no; not tonight.', 'The cat was cold.'],
+                 'Rank': ['The night is dark.', 'Yes.'],
+                 'Linde': ['The white cat saw the dog.', 'Yes, Torvald.']}
+        cache = TokenCache(max_entries=4)
+        vocabs = VocabularyRegistry(lines, token_cache=cache)
+        names = list(lines) * 20
+        with ThreadPoolExecutor(8) as executor:
+            trained = list(executor.map(vocabs.__getitem__, names))
+
+        for name, vocab in zip(names, trained):
+            self.assertIs(vocab, vocabs[name])
+        self.assertSetEqual(set(vocabs.trained()), set(lines))
+        for name, utterances in lines.items():
+            expected = Vocabulary()
+            expected.train(utterances)
+            self.assertDictEqual(vocabs[name].freqs_by_features,
+                                 expected.freqs_by_features)
+        # Each name was trained once, looking up each of its lines once
+        self.assertEqual(cache.hits + cache.misses, 8)
+        self.assertLessEqual(len(cache), 4)
+
+    def test_unknown_name(self):
+        vocabs = VocabularyRegistry({'Nora': ['Yes.']})
+        self.assertNotIn('Rank', vocabs)
+        with self.assertRaises(KeyError):
+            vocabs['Rank']
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,123 @@
+"""
+Times each stage of generating a play on synthetic plays of growing size
+(see synthetic_play.py), to show how each one scales.
+
+For every stage it prints the time taken and the peak memory allocated at
+each size, and how fast each grows with the size: a growth of about 1
+means the stage is linear in the size of the play, about 2 quadratic.
+
+python3 time_scaling.py 1 10 100
+"""
+
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from generator.dialogue import PlaySkeleton
+from generator.grammar import Grammar
+from generator.parse_play import Play
+from generator.vocabulary import VocabularyRegistry
+
+from synthetic_play import write_play
+
+STAGES = ['parse', 'skeleton', 'train', 'generate']
+STATES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      '..', 'generator', 'states.txt')
+
+
+class TimeScaling:
+
+    def __init__(self, scales=(1, 10, 100)):
+        self.scales = scales
+
+    def time_stages(self, scale):
+        """
+        :return: for each stage, (seconds, peak MiB allocated)
+        """
+        handle, filename = tempfile.mkstemp(suffix='.htm')
+        os.close(handle)
+        try:
+            write_play(filename, scale)
+            results = {}
+            play = self._measure(results, 'parse', lambda: Play(
+                filename, 'character', 'stage-direction'))
+        finally:
+            os.remove(filename)
+        skeleton = self._measure(results, 'skeleton', lambda: PlaySkeleton(
+            play, random.Random(0)))
+        vocabs = self._measure(results, 'train', lambda: self._train(
+            skeleton))
+        self._measure(results, 'generate', lambda: self._generate(
+            skeleton, vocabs))
+        return results
+
+    def time(self):
+        results = {}
+        for scale in self.scales:
+            results[scale] = self.time_stages(scale)
+            print('Scale', scale, 'done', file=sys.stderr)
+        self._print_table(results, 0, 'Time (seconds)')
+        self._print_table(results, 1, 'Peak memory (MiB)')
+
+    def _measure(self, results, stage, function):
+        tracemalloc.start()
+        time_before = time.perf_counter()
+        result = function()
+        time_after = time.perf_counter()
+        memory_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[stage] = (time_after - time_before, memory_peak / 2**20)
+        return result
+
+    def _train(self, skeleton):
+        vocabs = VocabularyRegistry(skeleton.chars)
+        for char in vocabs:
+            vocabs[char]
+        return vocabs
+
+    def _generate(self, skeleton, vocabs):
+        rng = random.Random(0)
+        grammar = Grammar(rng)
+        states = grammar.load_machine(STATES)
+        for act_name, speakers in skeleton.skeleton:
+            for speaker in speakers:
+                vocab = vocabs[speaker]
+                for i in range(vocab.random_sentence_count(rng)):
+                    vocab.build_sentence(
+                        grammar.make_template_simple(states, rng), rng)
+
+    def _print_table(self, results, column, title):
+        print()
+        print(title)
+        print('{:>10}'.format('scale') +
+              ''.join('{:>12}'.format(stage) for stage in STAGES))
+        previous = None
+        for scale in self.scales:
+            print('{:>10}'.format(scale) +
+                  ''.join('{:>12.3f}'.format(results[scale][stage][column])
+                          for stage in STAGES))
+            if previous is not None:
+                # The exponent k in value ~ scale^k between the two sizes
+                print('{:>10}'.format('growth') + ''.join(
+                    '{:>12.2f}'.format(self._growth(
+                        previous, scale, results[previous][stage][column],
+                        results[scale][stage][column]))
+                    for stage in STAGES))
+            previous = scale
+
+    @staticmethod
+    def _growth(scale_before, scale_after, before, after):
+        if before <= 0 or after <= 0:
+            return float('nan')
+        return math.log(after / before) / math.log(scale_after / scale_before)
+
+
+if __name__ == '__main__':
+    scales = [float(scale) if '.' in scale else int(scale)
+              for scale in sys.argv[1:]] or [1, 10, 100]
+    timer = TimeScaling(scales)
+    timer.time()
@@ -1,4 +1,5 @@
 import time
+import tracemalloc
 
 import nltk
 
@@ -10,10 +11,13 @@ class TimeVocabulary:
     def time_emma(self):
         emma_raw_text = nltk.corpus.gutenberg.raw('austen-emma.txt')
 
+        tracemalloc.start()
         time_before = time.perf_counter()
         vocab = Vocabulary()
         vocab.train([(emma_raw_text)])
         time_after_training = time.perf_counter()
+        memory_trained, memory_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
 
         sentence_tags = [START_SENTENCE, 'DT', 'JJ', 'NN', 'VBZ', 'DT', 'NN',
                          'IN', 'DT', 'NN', END_SENTENCE]
@@ -28,6 +32,8 @@ class TimeVocabulary:
         diff_training = time_after_training - time_before
         diff_sentence = time_after_sentence - time_after_training
         print('Time to train on Emma:', diff_training, 'seconds')
+        print('Memory after training:', memory_trained / 2**20, 'MiB,',
+              'peak while training:', memory_peak / 2**20, 'MiB')
         print('Time to generate', count, 'sentences:', diff_sentence)
         print('Sentences generated:')
         for sentence in sentences: